@@ -1,10 +1,20 @@
-from typing import Optional, List, Dict, Any
-import json
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Iterator, Literal
+import asyncio
+import functools
+import hashlib
+import io
+import logging
 import os
 import time
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import orjson
+import threading
+from cachetools import LFUCache, LRUCache, TTLCache
+from fastapi import FastAPI, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict
 from datetime import datetime
 
 
@@ -13,32 +23,46 @@ import polars as pl
 from main import (
     get_all_filter_options,
     get_data_optimized,
+    get_data_lazy,
     setup_groups,
     testCappedvsUncapped,
     get_max_processing_date,
     get_available_regions,
-    read_sql_polars
+    get_available_sba_classifications,
+    test_db_connection,
+    db_connection,
+    get_db_connection,
+    release_db_connection,
+    close_db_pool
 )
-from data_processor import load_and_process_csv
-import pandas as pd
+from data_processor import load_and_process_csv, save_processed_data
 
+# %-style arguments defer formatting until a handler actually emits the record
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
 
 
 class DataRequest(BaseModel):
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
     selected_columns: Optional[List[str]] = None
     region: str = "Rocky Mountain"
-    sba_filter: str = "Non-SBA"  # 'All', 'SBA', 'Non-SBA'
+    sba_filter: Literal['All', 'SBA', 'Non-SBA'] = "Non-SBA"
     line_of_business_ids: Optional[List[str]] = None
     commitment_size_groups: Optional[List[str]] = None
     risk_group_descriptions: Optional[List[str]] = None
     row_limit: Optional[int] = 1000
-    use_polars: bool = True
+    use_polars: bool = True  # accepted for compatibility; the data path always reads through Polars
+    format: Literal['json', 'arrow'] = 'json'
+    stream: bool = False  # NDJSON rows in chunks instead of one JSON document
 
 
 class CappedAnalysisRequest(BaseModel):
+    model_config = ConfigDict(extra='forbid', frozen=True)
+
     selected_columns: Optional[List[str]] = None
     region: str = "Rocky Mountain"
-    sba_filter: str = "Non-SBA"
+    sba_filter: Literal['All', 'SBA', 'Non-SBA'] = "Non-SBA"
     line_of_business_ids: Optional[List[str]] = None
     commitment_size_groups: Optional[List[str]] = None
     risk_group_descriptions: Optional[List[str]] = None
@@ -47,7 +71,46 @@ class CappedAnalysisRequest(BaseModel):
     use_polars: bool = True
 
 
-app = FastAPI(title="Composites API")
+async def _check_database() -> Dict[str, Any]:
+    try:
+        db_status = await asyncio.to_thread(test_db_connection)
+        logger.info("Database connection status: %s", db_status)
+        return db_status
+    except (RuntimeError, OSError) as e:
+        logger.warning("Database connection test failed, will use CSV data as fallback: %s", e)
+        return {"status": "failed", "error": str(e)}
+
+
+def _load_fallback() -> None:
+    _fallback_meta()
+    _analytics_frame()
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, '').lower() in ('1', 'true', 'yes')
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # The CSV fallback loads on first use, so workers that only serve /db/* never parse it
+    if _env_flag('PREWARM_FALLBACK'):
+        app.state.db_status, _ = await asyncio.gather(_check_database(), asyncio.to_thread(_load_fallback))
+    else:
+        app.state.db_status = await _check_database()
+
+    # Opt-in: runs in the background so it never delays readiness
+    prewarm = None
+    if _env_flag('PREWARM_COMPOSITES'):
+        prewarm = asyncio.create_task(_prewarm_composites())
+
+    yield
+
+    if prewarm is not None and not prewarm.done():
+        prewarm.cancel()
+    close_db_pool()
+
+
+app = FastAPI(title="Composites API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -56,31 +119,156 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+PROCESSED_JSON = 'processed_data.json'
+PROCESSED_PARQUET = 'processed_data.parquet'
+PROCESSED_META = 'processed_data_meta.json'
+
+
+def _load_processed_json() -> Dict[str, Any]:
+    """CSV fallback data from processed_data.json, generating it from the CSV if missing"""
+    try:
+        if os.path.exists(PROCESSED_JSON):
+            with open(PROCESSED_JSON, 'rb') as f:
+                data = orjson.loads(f.read())
+        else:
+            logger.info("processed_data.json not found, generating from CSV...")
+            data = load_and_process_csv()
+            save_processed_data(data, PROCESSED_JSON)
+        return data
+    except (FileNotFoundError, orjson.JSONDecodeError, KeyError) as e:
+        logger.error("Error loading CSV fallback data: %s", e)
+        return {"filter_options": {}, "analytics_data": [], "raw_data": [], "summary": {}}
+
+
+def _is_stale(path: str) -> bool:
+    """True if a derived fallback file is missing or older than processed_data.json"""
+    if not os.path.exists(path):
+        return True
+    return os.path.exists(PROCESSED_JSON) and os.path.getmtime(PROCESSED_JSON) > os.path.getmtime(path)
+
+
+def _replace_atomically(path: str, write: Callable[[str], None]) -> None:
+    """Write to a per-process temp file and rename it over path, so readers never see a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+@functools.cache
+def _migrate_processed_data() -> Dict[str, Any]:
+    """Split the JSON fallback into a Parquet frame plus a small metadata sidecar (once per process)"""
+    data = _load_processed_json()
+    analytics_data = data.get("analytics_data", [])
+    if analytics_data:
+        frame = pl.from_dicts(analytics_data, infer_schema_length=None)
+        _replace_atomically(
+            PROCESSED_PARQUET,
+            lambda path: frame.write_parquet(path, compression='zstd', statistics=True),
+        )
+    meta = {"filter_options": data.get("filter_options", {}), "summary": data.get("summary", {})}
+    body = orjson.dumps(meta, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS, default=str)
+
+    def write_meta(path: str) -> None:
+        with open(path, 'wb') as f:
+            f.write(body)
+
+    _replace_atomically(PROCESSED_META, write_meta)
+    return meta
+
+
+@functools.cache
+def _fallback_meta() -> Dict[str, Any]:
+    """filter_options and summary of the CSV fallback, loaded on first use"""
+    try:
+        meta = None
+        if not _is_stale(PROCESSED_META):
+            try:
+                with open(PROCESSED_META, 'rb') as f:
+                    meta = orjson.loads(f.read())
+            except orjson.JSONDecodeError as e:
+                logger.warning("Rebuilding unreadable %s: %s", PROCESSED_META, e)
+        if meta is None:
+            meta = _migrate_processed_data()
+        logger.info("Loaded CSV fallback data: %s", meta['summary'])
+        return meta
+    except (OSError, orjson.JSONDecodeError, KeyError) as e:
+        logger.error("Error loading CSV fallback metadata: %s", e)
+        return {"filter_options": {}, "summary": {}}
+
+
+@functools.cache
+def _analytics_frame() -> pl.DataFrame:
+    """Fallback analytics_data, memory-mapped from Parquet so workers share pages"""
+    try:
+        if _is_stale(PROCESSED_PARQUET):
+            _migrate_processed_data()
+        if os.path.exists(PROCESSED_PARQUET):
+            try:
+                return pl.read_parquet(PROCESSED_PARQUET, memory_map=True)
+            except pl.exceptions.PolarsError as e:
+                # Truncated or corrupt (e.g. left by a crash mid-write before writes were atomic)
+                logger.warning("Rebuilding unreadable %s: %s", PROCESSED_PARQUET, e)
+                os.remove(PROCESSED_PARQUET)
+                _migrate_processed_data.cache_clear()
+                _migrate_processed_data()
+                if os.path.exists(PROCESSED_PARQUET):
+                    return pl.read_parquet(PROCESSED_PARQUET, memory_map=True)
+    except (OSError, pl.exceptions.PolarsError) as e:
+        logger.error("Error loading CSV fallback frame: %s", e)
+    return pl.DataFrame()
+
+
+@functools.cache
+def _analysis_frame() -> pl.DataFrame:
+    """Fallback frame with ProcessingDateKey as a YYYYMMDD integer, as testCappedvsUncapped expects"""
+    frame = _analytics_frame()
+    if 'ProcessingDateKey' not in frame.columns:
+        return frame
+    # data_processor writes YYYY-MM-DD, so dropping the dashes is enough; no date parse needed
+    return frame.with_columns(
+        pl.col('ProcessingDateKey').str.replace_all('-', '', literal=True).cast(pl.Int64, strict=False)
+    )
+
+
+@functools.cache
+def _analytics_columns() -> List[str]:
+    return _analytics_frame().columns
+
+
+def _fallback_rows(row_limit: Optional[int], selected_columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """First row_limit fallback rows plus their column list"""
+    frame = _analytics_frame()
+    limited = frame.head(row_limit) if row_limit else frame
+    return {
+        "rows": limited.rows(named=True),
+        "columns": selected_columns or _analytics_columns(),
+    }
+
+
+@functools.cache
+def _fallback_series_rows() -> List[Dict[str, Any]]:
+    """Fallback analytics_data projected to the composite series shape, built once"""
+    frame = _analytics_frame()
+    if frame.is_empty():
+        return []
+    return frame.select([
+        "ProcessingDateKey",
+        pl.col("CommitmentAmt").alias("ca"),
+        pl.col("OutstandingAmt").alias("oa"),
+        pl.col("Deals").alias("deals"),
+    ]).rows(named=True)
+
+
+def _fallback_series(row_limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    series = _fallback_series_rows()
+    return series[:row_limit] if row_limit else series
 
-# Load processed data as fallback
-try:
-    if os.path.exists('processed_data.json'):
-        with open('processed_data.json', 'r', encoding='utf-8') as f:
-            PROCESSED_DATA = json.load(f)
-        print(f"Loaded CSV fallback data: {PROCESSED_DATA['summary']}")
-    else:
-        print("processed_data.json not found, generating from CSV...")
-        PROCESSED_DATA = load_and_process_csv()
-        with open('processed_data.json', 'w', encoding='utf-8') as f:
-            json.dump(PROCESSED_DATA, f, indent=2, default=str)
-except (FileNotFoundError, json.JSONDecodeError, KeyError) as e:
-    print(f"Error loading CSV fallback data: {e}")
-    PROCESSED_DATA = {"filter_options": {}, "analytics_data": [], "raw_data": [], "summary": {}}
-
-# Test database connection on startup
-try:
-    from main import test_db_connection
-
-    db_status = test_db_connection()
-    print(f"Database connection status: {db_status}")
-except (ImportError, RuntimeError, OSError) as e:
-    print(f"Database connection test failed: {e}")
-    print("Will use CSV data as fallback")
 
 class FilterRequest(BaseModel):
     """Request model for filtered queries"""
@@ -94,27 +282,123 @@ class QueryResponse(BaseModel):
     results: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
     execution_time: Optional[float] = None
+    stale: bool = False  # True when served from cache because the database query failed
+
+
 
+def _period_change(column: str) -> pl.Expr:
+    """Period-over-period change of a column; 0.0 for the first period and zero priors"""
+    prior = pl.col(column).shift(1)
+    return (
+        pl.when(prior.is_null() | (prior == 0))
+        .then(0.0)
+        .otherwise((pl.col(column) - prior) / prior)
+    )
+
+
+# Tiered TTLs (seconds) for DB-backed lookups, by how often the underlying data moves
+CACHE_TTL_SHORT = 10
+CACHE_TTL_NORMAL = 30
+CACHE_TTL_LONG = 60
+
+_DB_CACHE: Dict[Any, tuple] = {}  # key -> (expires_at, value)
+_DB_CACHE_LOCK = threading.Lock()
+
+
+def _cached_call(key: Any, ttl: float, fn, *args: Any) -> Any:
+    """fn(*args) memoized for ttl seconds; on an error or empty result the last good value is served instead"""
+    now = time.monotonic()
+    with _DB_CACHE_LOCK:
+        entry = _DB_CACHE.get(key)
+    if entry is not None and now < entry[0]:
+        return entry[1]
+
+    try:
+        value = fn(*args)
+    except Exception as e:
+        if entry is None:
+            raise
+        logger.warning("Serving stale %s after error: %s", key, e)
+        return entry[1]
+
+    if value:
+        with _DB_CACHE_LOCK:
+            _DB_CACHE[key] = (now + ttl, value)
+    elif entry is not None:
+        logger.warning("Serving stale %s after empty result", key)
+        return entry[1]
+    return value
+
+
+def _arrow_response(df: pl.DataFrame) -> Response:
+    """Arrow IPC stream for clients that decode with apache-arrow instead of JSON rows"""
+    buf = io.BytesIO()
+    df.write_ipc_stream(buf, compression='lz4')
+    return Response(buf.getvalue(), media_type="application/vnd.apache.arrow.stream")
+
+
+def _json_response(df: pl.DataFrame, rows_key: str, **fields: Any) -> Response:
+    """JSON object with df's rows under rows_key, encoded by Polars without building Python dicts"""
+    body = b'{' + orjson.dumps(rows_key) + b':' + df.write_json().encode()
+    for key, value in fields.items():
+        body += b',' + orjson.dumps(key) + b':' + orjson.dumps(value)
+    return Response(body + b'}', media_type="application/json")
+
+
+# key -> (source object, (body, etag)); a rebuilt source replaces its key's entry, and the bound
+# keeps a stray key from holding a body for the life of the process
+_ENCODED_CACHE: LRUCache = LRUCache(maxsize=16)
+_ENCODED_CACHE_LOCK = threading.Lock()
+
+
+def _encoded(key: Any, source: Any, build=None) -> tuple:
+    """(body, etag) for build(source), re-encoded only when the cached source object changes"""
+    with _ENCODED_CACHE_LOCK:
+        entry = _ENCODED_CACHE.get(key)
+    if entry is not None and entry[0] is source:
+        return entry[1]
+    body = orjson.dumps(build(source) if build else source, option=orjson.OPT_NON_STR_KEYS, default=str)
+    encoded = (body, f'"{hashlib.sha1(body).hexdigest()}"')
+    with _ENCODED_CACHE_LOCK:
+        _ENCODED_CACHE[key] = (source, encoded)
+    return encoded
+
+
+def _etag_response(encoded: tuple, if_none_match: Optional[str]) -> Response:
+    """Pre-encoded JSON with a strong ETag; 304 with no body when the client already holds it"""
+    body, etag = encoded
+    headers = {"ETag": etag, "Cache-Control": f"max-age={CACHE_TTL_NORMAL}"}
+    if if_none_match:
+        candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        if etag in candidates or '*' in candidates:
+            return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _ndjson_chunks(df: pl.DataFrame, chunk_rows: int = 10_000) -> Iterator[bytes]:
+    for batch in df.iter_slices(n_rows=chunk_rows):
+        buf = io.BytesIO()
+        batch.write_ndjson(buf)
+        yield buf.getvalue()
 
 
 @app.get("/health")
-def health() -> Dict[str, str]:
+async def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
 @app.get("/db/status")
-def database_status() -> Dict[str, Any]:
+async def database_status() -> Dict[str, Any]:
     """Check database connection status"""
     try:
-        from main import test_db_connection
-        status = test_db_connection()
+        status = await asyncio.to_thread(test_db_connection)
         return status
-    except (ImportError, RuntimeError, OSError) as e:
+    except (RuntimeError, OSError) as e:
         return {"status": "failed", "error": str(e)}
 
 
 @app.get("/db/config")
-def database_config() -> Dict[str, Any]:
+async def database_config() -> Dict[str, Any]:
     """Check database configuration"""
     try:
         config = {
@@ -131,29 +415,28 @@ def database_config() -> Dict[str, Any]:
 
 
 @app.get("/filters")
-def filters(use_polars: bool = True) -> Dict[str, Any]:
+async def filters(use_polars: bool = True, if_none_match: Optional[str] = Header(None)) -> Dict[str, Any]:
     """Get filter options from PostgreSQL database with CSV fallback"""
     try:
-        print("Attempting to get filters from PostgreSQL database...")
-        result = get_all_filter_options(use_polars)
-        print(f"Successfully loaded filters from database: {len(result)} filter categories")
-        return result
+        result = await asyncio.to_thread(
+            _cached_call, ('filter_options', use_polars), CACHE_TTL_NORMAL, get_all_filter_options, use_polars
+        )
+        logger.debug("Loaded %d filter categories from database", len(result))
+        return _etag_response(_encoded(('filters', use_polars), result), if_none_match)
     except (RuntimeError, OSError, ConnectionError) as e:
-        print(f"Database filters failed, using CSV fallback: {e}")
-        fallback_data = PROCESSED_DATA.get("filter_options", {})
-        print(f"Using CSV fallback with {len(fallback_data)} filter categories")
-        return fallback_data
+        logger.warning("Database filters failed, using CSV fallback: %s", e)
+        fallback_data = _fallback_meta().get("filter_options", {})
+        return _etag_response(_encoded('csv_filters', fallback_data), if_none_match)
 
 
 @app.post("/data")
-def data(req: DataRequest) -> Dict[str, Any]:
+async def data(req: DataRequest) -> Dict[str, Any]:
     """Get data from PostgreSQL database with CSV fallback"""
     try:
-        print(
-            f"Attempting to get data from PostgreSQL database with filters: region={req.region}, sba_filter={req.sba_filter}")
-        df = get_data_optimized(
+        df = await asyncio.to_thread(
+            get_data_optimized,
             selected_columns=req.selected_columns,
-            use_polars=req.use_polars,
+            use_polars=True,
             show_timing=False,
             row_limit=req.row_limit,
             region=req.region,
@@ -164,102 +447,142 @@ def data(req: DataRequest) -> Dict[str, Any]:
         )
 
         if df is None:
-            print("Database returned None, using CSV fallback")
-            analytics_data = PROCESSED_DATA.get("analytics_data", [])
-            limited_data = analytics_data[:req.row_limit] if req.row_limit else analytics_data
-            return {
-                "rows": limited_data,
-                "columns": req.selected_columns or list(limited_data[0].keys()) if limited_data else [],
-                "source": "csv_fallback"
-            }
+            logger.info("Database returned None, using CSV fallback")
+            return {**_fallback_rows(req.row_limit, req.selected_columns), "source": "csv_fallback"}
 
-        if hasattr(df, "to_dicts"):
-            result = {"rows": df.to_dicts(), "columns": list(df.columns), "source": "database"}
-            print(f"Successfully returned {len(result['rows'])} rows from PostgreSQL database")
-            return result
-        else:
-            result = {"rows": df.to_dict(orient="records"), "columns": list(df.columns), "source": "database"}
-            print(f"Successfully returned {len(result['rows'])} rows from PostgreSQL database (pandas)")
-            return result
+        if req.format == 'arrow':
+            return _arrow_response(df)
+        if req.stream:
+            return StreamingResponse(_ndjson_chunks(df), media_type="application/x-ndjson")
+
+        logger.debug("Returned %d rows from PostgreSQL database", df.height)
+        return _json_response(df, "rows", columns=df.columns, source="database")
 
     except Exception as e:
-        print(f"Database data failed, using CSV fallback: {e}")
-        analytics_data = PROCESSED_DATA.get("analytics_data", [])
-        limited_data = analytics_data[:req.row_limit] if req.row_limit else analytics_data
-        return {
-            "rows": limited_data,
-            "columns": req.selected_columns or list(limited_data[0].keys()) if limited_data else [],
-            "source": "csv_fallback",
-            "error": str(e)
-        }
+        logger.warning("Database data failed, using CSV fallback: %s", e)
+        return {**_fallback_rows(req.row_limit, req.selected_columns), "source": "csv_fallback", "error": str(e)}
+
+
+# Composites only change with the batch load; keyed on every input that shapes the query
+_COMPOSITES_CACHE: TTLCache = TTLCache(maxsize=64, ttl=300)
+_COMPOSITES_CACHE_LOCK = threading.Lock()
+
+
+def _composites_key(req: DataRequest) -> tuple:
+    return (
+        req.region,
+        req.sba_filter,
+        tuple(req.line_of_business_ids or ()),
+        tuple(req.commitment_size_groups or ()),
+        tuple(req.risk_group_descriptions or ()),
+        tuple(req.selected_columns or ()),
+        req.row_limit,
+    )
+
+
+def _build_composites(req: DataRequest) -> Optional[pl.DataFrame]:
+    """Grouped and capped composite series for a request, or None if the database returned nothing"""
+    key = _composites_key(req)
+    with _COMPOSITES_CACHE_LOCK:
+        cached = _COMPOSITES_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    df = get_data_lazy(
+        selected_columns=req.selected_columns,
+        row_limit=req.row_limit,
+        region=req.region,
+        sba_filter=req.sba_filter,
+        line_of_business_ids=req.line_of_business_ids,
+        commitment_size_groups=req.commitment_size_groups,
+        risk_group_descriptions=req.risk_group_descriptions,
+    )
+    if df is None:
+        return None
+
+    # Build grouped and capped composites using your main.py logic
+    ca_pivot, oa_pivot, deals_pivot = setup_groups(df)
+    result = pl.DataFrame({
+        "ProcessingDateKey": ca_pivot["ProcessingDateKey"],
+        "ca": ca_pivot["perc_diff"],
+        "oa": oa_pivot["perc_diff"],
+        "deals": deals_pivot["perc_diff"],
+    })
+    with _COMPOSITES_CACHE_LOCK:
+        _COMPOSITES_CACHE[key] = result
+    return result
+
+
+async def _prewarm_composites() -> None:
+    """Fill the composites cache for every region and SBA classification"""
+    regions = await asyncio.to_thread(get_available_regions)
+    for region in regions:
+        for sba_filter in get_available_sba_classifications():
+            try:
+                await asyncio.to_thread(_build_composites, DataRequest(region=region, sba_filter=sba_filter))
+            except Exception as e:
+                logger.warning("Composite prewarm failed for %s/%s: %s", region, sba_filter, e)
+    logger.info("Prewarmed composites cache with %d entries", len(_COMPOSITES_CACHE))
 
 
 @app.post("/composites")
-def composites(req: DataRequest) -> Dict[str, Any]:
+async def composites(req: DataRequest) -> Dict[str, Any]:
     """Get composite analysis from PostgreSQL database with CSV fallback"""
     try:
-        print(f"Attempting to get composites from PostgreSQL database with filters: region={req.region}")
-        df = get_data_optimized(
-            selected_columns=req.selected_columns,
-            use_polars=True,
-            show_timing=False,
-            row_limit=req.row_limit,
-            region=req.region,
-            sba_filter=req.sba_filter,
-            line_of_business_ids=req.line_of_business_ids,
-            commitment_size_groups=req.commitment_size_groups,
-            risk_group_descriptions=req.risk_group_descriptions,
-        )
+        result = await asyncio.to_thread(_build_composites, req)
 
-        if df is None or not hasattr(df, 'select'):
-            print("Database returned None or invalid DataFrame, using CSV fallback")
-            analytics_data = PROCESSED_DATA.get("analytics_data", [])
-            series = []
-            for item in analytics_data:
-                series.append({
-                    "ProcessingDateKey": item["ProcessingDateKey"],
-                    "ca": item["CommitmentAmt"],
-                    "oa": item["OutstandingAmt"],
-                    "deals": item["Deals"]
-                })
-            return {"series": series, "source": "csv_fallback"}
-
-        # Build grouped and capped composites using your main.py logic
-        print("Building composites from database data...")
-        ca_pivot, oa_pivot, deals_pivot = setup_groups(df)
-        result = pl.DataFrame({
-            "ProcessingDateKey": ca_pivot["ProcessingDateKey"],
-            "ca": ca_pivot["perc_diff"],
-            "oa": oa_pivot["perc_diff"],
-            "deals": deals_pivot["perc_diff"],
-        })
+        if result is None:
+            logger.info("Database returned None, using CSV fallback")
+            return {"series": _fallback_series(), "source": "csv_fallback"}
+
+        if req.format == 'arrow':
+            return _arrow_response(result)
 
-        composites_result = {"series": result.to_dicts(), "source": "database"}
-        print(f"Successfully returned {len(composites_result['series'])} composite records from PostgreSQL")
-        return composites_result
+        logger.debug("Returned %d composite records from PostgreSQL", result.height)
+        return _json_response(result, "series", source="database")
 
     except Exception as e:
-        print(f"Database composites failed, using CSV fallback: {e}")
-        analytics_data = PROCESSED_DATA.get("analytics_data", [])
-        series = []
-        for item in analytics_data:
-            series.append({
-                "ProcessingDateKey": item["ProcessingDateKey"],
-                "ca": item["CommitmentAmt"],
-                "oa": item["OutstandingAmt"],
-                "deals": item["Deals"]
-            })
-        return {"series": series, "source": "csv_fallback", "error": str(e)}
+        logger.warning("Database composites failed, using CSV fallback: %s", e)
+        return {"series": _fallback_series(), "source": "csv_fallback", "error": str(e)}
+
+
+def _capped_analysis(df: pl.DataFrame, output_file: Optional[str]) -> List[Dict[str, Any]]:
+    """Period diffs plus testCappedvsUncapped as one worker-thread job, so none of it runs on the event loop"""
+    # For CSV data, use the existing calculated differences
+    if 'ca_diff' in df.columns and 'oa_diff' in df.columns and 'deals_diff' in df.columns:
+        ca_perc_diff = df['ca_diff'].fill_null(0.0)
+        oa_perc_diff = df['oa_diff'].fill_null(0.0)
+        deals_perc_diff = df['deals_diff'].fill_null(0.0)
+    else:
+        # Calculate simple period-over-period changes in a single vectorized pass
+        diffs = df.sort('ProcessingDateKey').select([
+            _period_change('CommitmentAmt').alias('ca'),
+            _period_change('OutstandingAmt').alias('oa'),
+            _period_change('Deals').alias('deals'),
+        ])
+        ca_perc_diff = diffs['ca']
+        oa_perc_diff = diffs['oa']
+        deals_perc_diff = diffs['deals']
+
+    result_df = testCappedvsUncapped(
+        cla_input_df=df,
+        ca_perc_diff=ca_perc_diff,
+        oa_perc_diff=oa_perc_diff,
+        deals_perc_diff=deals_perc_diff,
+        file_name=output_file
+    )
+
+    # testCappedvsUncapped always returns a Polars frame
+    return result_df.rows(named=True)
 
 
 @app.post("/analysis/capped-vs-uncapped")
-def capped_vs_uncapped_analysis(req: CappedAnalysisRequest) -> Dict[str, Any]:
+async def capped_vs_uncapped_analysis(req: CappedAnalysisRequest) -> Dict[str, Any]:
     """Run capped vs uncapped analysis using testCappedvsUncapped function"""
     try:
-        print(f"Running capped vs uncapped analysis with cap_value={req.cap_value}")
-
         # Get the base data first
-        df = get_data_optimized(
+        df = await asyncio.to_thread(
+            get_data_optimized,
             selected_columns=req.selected_columns,
             use_polars=True,
             show_timing=False,
@@ -272,73 +595,16 @@ def capped_vs_uncapped_analysis(req: CappedAnalysisRequest) -> Dict[str, Any]:
         )
 
         if df is None or not hasattr(df, 'select'):
-            print("Database failed, using CSV data for capped analysis")
+            logger.info("Database failed, using CSV data for capped analysis")
             # Use CSV data as fallback
-            analytics_data = PROCESSED_DATA.get("analytics_data", [])
-            if not analytics_data:
+            df = _analysis_frame()
+            if df.is_empty():
                 return {"error": "No data available for capped analysis", "source": "no_data"}
 
-            # Convert CSV data to format needed for testCappedvsUncapped
-            import pandas as pd
-            csv_df = pd.DataFrame(analytics_data)
-
-            # Convert date strings to integers (YYYYMMDD format)
-            if 'ProcessingDateKey' in csv_df.columns:
-                csv_df['ProcessingDateKey'] = pd.to_datetime(csv_df['ProcessingDateKey']).dt.strftime('%Y%m%d').astype(
-                    int)
-
-            df = pl.from_pandas(csv_df)
-            print(f"Using CSV fallback data with {len(df)} records, converted dates to integer format")
-
-        print(f"Available columns: {df.columns}")
-
-        # For CSV data, use the existing calculated differences
-        if 'ca_diff' in df.columns and 'oa_diff' in df.columns and 'deals_diff' in df.columns:
-            print("Using existing calculated differences from CSV data")
-            ca_perc_diff = df['ca_diff'].fill_null(0.0)
-            oa_perc_diff = df['oa_diff'].fill_null(0.0)
-            deals_perc_diff = df['deals_diff'].fill_null(0.0)
-        else:
-            print("Calculating percentage differences from available data")
-            # Calculate simple period-over-period changes
-            df_sorted = df.sort('ProcessingDateKey')
-
-            ca_perc_diff = pl.Series([0.0] + [
-                (df_sorted['CommitmentAmt'][i] - df_sorted['CommitmentAmt'][i - 1]) / df_sorted['CommitmentAmt'][i - 1]
-                if df_sorted['CommitmentAmt'][i - 1] != 0 else 0.0
-                for i in range(1, len(df_sorted))
-            ])
-
-            oa_perc_diff = pl.Series([0.0] + [
-                (df_sorted['OutstandingAmt'][i] - df_sorted['OutstandingAmt'][i - 1]) / df_sorted['OutstandingAmt'][
-                    i - 1]
-                if df_sorted['OutstandingAmt'][i - 1] != 0 else 0.0
-                for i in range(1, len(df_sorted))
-            ])
-
-            deals_perc_diff = pl.Series([0.0] + [
-                (df_sorted['Deals'][i] - df_sorted['Deals'][i - 1]) / df_sorted['Deals'][i - 1]
-                if df_sorted['Deals'][i - 1] != 0 else 0.0
-                for i in range(1, len(df_sorted))
-            ])
-
         # Run the capped vs uncapped analysis
-        output_file = req.output_file or f"capped_analysis_{int(time.time())}.csv"
-        print(f"Running testCappedvsUncapped with {len(df)} input records...")
-
-        result_df = testCappedvsUncapped(
-            cla_input_df=df,
-            ca_perc_diff=ca_perc_diff,
-            oa_perc_diff=oa_perc_diff,
-            deals_perc_diff=deals_perc_diff,
-            file_name=output_file
-        )
-
-        # Convert result to JSON format
-        if hasattr(result_df, 'to_dicts'):
-            analysis_results = result_df.to_dicts()
-        else:
-            analysis_results = result_df.to_dict('records')
+        output_file = req.output_file  # None skips writing a CSV to disk
+        logger.debug("Running testCappedvsUncapped with %d input records", len(df))
+        analysis_results = await asyncio.to_thread(_capped_analysis, df, output_file)
 
         return {
             "analysis_results": analysis_results,
@@ -358,204 +624,163 @@ def capped_vs_uncapped_analysis(req: CappedAnalysisRequest) -> Dict[str, Any]:
         }
 
     except (RuntimeError, OSError, ConnectionError, ValueError, KeyError) as e:
-        print(f"Capped vs uncapped analysis failed: {e}")
+        logger.warning("Capped vs uncapped analysis failed: %s", e)
         return {"error": str(e), "source": "analysis_failed"}
 
 
 # CSV-specific endpoints for dashboard
 @app.get("/csv/filters")
-def csv_filters() -> Dict[str, Any]:
+async def csv_filters(if_none_match: Optional[str] = Header(None)) -> Dict[str, Any]:
     """Get filter options from CSV data"""
-    return PROCESSED_DATA.get("filter_options", {})
+    return _etag_response(_encoded('csv_filters', _fallback_meta().get("filter_options", {})), if_none_match)
 
 
 @app.post("/csv/data")
-def csv_data(req: DataRequest) -> Dict[str, Any]:
+async def csv_data(req: DataRequest) -> Dict[str, Any]:
     """Get analytics data from CSV"""
-    analytics_data = PROCESSED_DATA.get("analytics_data", [])
-    limited_data = analytics_data[:req.row_limit] if req.row_limit else analytics_data
     return {
-        "rows": limited_data,
-        "columns": req.selected_columns or list(limited_data[0].keys()) if limited_data else [],
-        "summary": PROCESSED_DATA.get("summary", {})
+        **_fallback_rows(req.row_limit, req.selected_columns),
+        "summary": _fallback_meta().get("summary", {})
     }
 
 
 @app.post("/csv/composites")
-def csv_composites(req: DataRequest) -> Dict[str, Any]:
+async def csv_composites(req: DataRequest) -> Dict[str, Any]:
     """Get composite analysis from CSV data"""
-    analytics_data = PROCESSED_DATA.get("analytics_data", [])
-    series = []
-    for item in analytics_data:
-        series.append({
-            "ProcessingDateKey": item["ProcessingDateKey"],
-            "ca": item["CommitmentAmt"],
-            "oa": item["OutstandingAmt"],
-            "deals": item["Deals"]
-        })
-    limited_series = series[:req.row_limit] if req.row_limit else series
     return {
-        "series": limited_series,
-        "metadata": PROCESSED_DATA.get("summary", {})
+        "series": _fallback_series(req.row_limit),
+        "metadata": _fallback_meta().get("summary", {})
     }
 
 
-@app.get("/db/maxdate")
-def get_max_date() -> Dict[str, Any]:
-    """Get the latest processing date from the database"""
-    try:
-        from main import get_db_connection
-        conn = get_db_connection()
-
+def _fetch_overview() -> Dict[str, Any]:
+    """Latest date, month count and latest-month totals in one pass over the view"""
+    with db_connection() as conn:
         if not conn:
-            return {"status": "failed", "error": "Unable to connect to database"}
+            raise ConnectionError("Unable to connect to database")
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                WITH mx AS (
+                    SELECT MAX("ProcessingDateKey") AS m
+                    FROM cla_uat.mv_t_cla_input_full_upd
+                )
+                SELECT
+                    (SELECT m FROM mx) AS max_date,
+                    COUNT(DISTINCT "ProcessingDateKey") AS months_available,
+                    COUNT(*) FILTER (WHERE "ProcessingDateKey" = (SELECT m FROM mx)) AS record_count,
+                    SUM("CommitmentAmt") FILTER (WHERE "ProcessingDateKey" = (SELECT m FROM mx)) AS total_commitment
+                FROM cla_uat.mv_t_cla_input_full_upd
+            ''')
+            max_date, months_available, record_count, total_commitment = cursor.fetchone()
+    return {
+        "max_date": max_date,
+        "months_available": months_available,
+        "record_count": record_count or 0,
+        "total_commitment": total_commitment or 0,
+    }
 
-        cursor = conn.cursor()
-        cursor.execute('SELECT MAX("ProcessingDateKey") FROM cla_uat.mv_t_cla_input_full_upd')
-        max_date = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
 
-        return {
+async def _overview() -> Dict[str, Any]:
+    return await asyncio.to_thread(_cached_call, 'overview', CACHE_TTL_NORMAL, _fetch_overview)
+
+
+@app.get("/db/overview")
+async def get_overview() -> Dict[str, Any]:
+    """Latest processing date, months available and latest-month stats in a single round trip"""
+    try:
+        return {"status": "success", **await _overview()}
+    except Exception as e:
+        return {"status": "failed", "error": str(e)}
+
+
+@app.get("/db/maxdate")
+async def get_max_date(if_none_match: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """Get the latest processing date from the database"""
+    try:
+        overview = await _overview()
+        encoded = _encoded('maxdate', overview, lambda o: {
             "status": "success",
-            "max_date": max_date
-        }
+            "max_date": o["max_date"]
+        })
+        return _etag_response(encoded, if_none_match)
     except Exception as e:
         return {"status": "failed", "error": str(e)}
 
 
 @app.get("/db/months-available")
-def get_months_available() -> Dict[str, Any]:
+async def get_months_available() -> Dict[str, Any]:
     """Get the count of distinct months available in the database"""
     try:
-        from main import get_db_connection
-        conn = get_db_connection()
-
-        if not conn:
-            return {"status": "failed", "error": "Unable to connect to database"}
-
-        cursor = conn.cursor()
-        # Count distinct year-month combinations
-        cursor.execute('''
-            SELECT COUNT(DISTINCT "ProcessingDateKey") as months_available
-            FROM cla_uat.mv_t_cla_input_full_upd
-        ''')
-        months_count = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
-
+        overview = await _overview()
         return {
             "status": "success",
-            "months_available": months_count
+            "months_available": overview["months_available"]
         }
     except Exception as e:
         return {"status": "failed", "error": str(e)}
 
 
 @app.get("/db/latest-month-stats")
-def get_latest_month_stats() -> Dict[str, Any]:
+async def get_latest_month_stats() -> Dict[str, Any]:
     """Get record count and total commitment for the latest month"""
     try:
-        from main import get_db_connection
-        conn = get_db_connection()
-
-        if not conn:
-            return {"status": "failed", "error": "Unable to connect to database"}
-
-        cursor = conn.cursor()
-
-        # Get stats for the latest month
-        cursor.execute('''
-            WITH latest_month AS (
-                SELECT MAX("ProcessingDateKey") as max_date
-                FROM cla_uat.mv_t_cla_input_full_upd
-            )
-            SELECT 
-                COUNT(*) as record_count,
-                SUM("CommitmentAmt") as total_commitment
-            FROM cla_uat.mv_t_cla_input_full_upd
-            WHERE "ProcessingDateKey" = 
-                  (SELECT max_date FROM latest_month)
-        ''')
-
-        result = cursor.fetchone()
-        record_count = result[0] if result[0] else 0
-        total_commitment = result[1] if result[1] else 0
-
-        cursor.close()
-        conn.close()
-
+        overview = await _overview()
         return {
             "status": "success",
-            "record_count": record_count,
-            "total_commitment": total_commitment
+            "record_count": overview["record_count"],
+            "total_commitment": overview["total_commitment"]
         }
     except Exception as e:
         return {"status": "failed", "error": str(e)}
 
 
+def _format_filter_options(filter_options: Dict[str, Any]) -> Dict[str, Any]:
+    """get_all_filter_options result keyed the way the UI filter panel expects"""
+    return {
+        "lineOfBusiness": filter_options.get('line_of_business_ids', []),
+        "commitmentSizeGroup": filter_options.get('commitment_size_groups', []),
+        "riskGroup": filter_options.get('risk_group_descriptions', []),
+        "bankId": [],  # Add this if you have bank IDs in your database
+        "region": filter_options.get('regions', []),
+        "naicsGrpName": filter_options.get('sba_classifications', [])  # Map SBA to NAICS
+    }
+
+
 @app.get("/db/filter-options")
-async def get_filter_options():
+async def get_filter_options(if_none_match: Optional[str] = Header(None)):
     """Get all available filter options for the UI - Database only"""
     try:
-        print("=== FILTER OPTIONS REQUEST RECEIVED ===")
-        print("Fetching filter options from database...")
-
         # Check if we have a database connection first
-        from main import get_db_connection
-        conn = get_db_connection()
+        conn = await asyncio.to_thread(get_db_connection)
         if not conn:
-            print("ERROR: Database connection not available")
+            logger.error("Database connection not available")
             return {
                 "status": "error",
                 "error": "Database connection not available"
             }
-        print("Database connection OK")
-        conn.close()  # Close it since get_all_filter_options handles its own connection
+        release_db_connection(conn)  # get_all_filter_options borrows its own connections
 
-        # Import and use your existing function from main.py
-        from main import get_all_filter_options
-        print("Calling get_all_filter_options...")
-        filter_options = get_all_filter_options(use_polars=True)
+        filter_options = await asyncio.to_thread(
+            _cached_call, ('filter_options', True), CACHE_TTL_NORMAL, get_all_filter_options, True
+        )
 
         if not filter_options:
-            print("ERROR: No filter options returned from database")
+            logger.error("No filter options returned from database")
             return {
                 "status": "error",
                 "error": "No filter options returned from database"
             }
 
-        print(f"Successfully loaded {len(filter_options)} filter categories from database")
-        print("Filter categories found:")
-        for key, values in filter_options.items():
-            print(f"  {key}: {len(values)} options")
-
-        # Format the response
-        formatted_options = {
-            "lineOfBusiness": filter_options.get('line_of_business_ids', []),
-            "commitmentSizeGroup": filter_options.get('commitment_size_groups', []),
-            "riskGroup": filter_options.get('risk_group_descriptions', []),
-            "bankId": [],  # Add this if you have bank IDs in your database
-            "region": filter_options.get('regions', []),
-            "naicsGrpName": filter_options.get('sba_classifications', [])  # Map SBA to NAICS
-        }
-
-        print("=== FORMATTED OPTIONS FOR UI ===")
-        for key, values in formatted_options.items():
-            print(f"  {key}: {len(values)} options")
-            if len(values) > 0:
-                print(f"    Sample: {values[:3]}...")  # Show first 3 items
-
-        return {
+        # Formatting and encoding rerun only when the cached filter options are refreshed
+        encoded = _encoded('db_filter_options', filter_options, lambda options: {
             "status": "success",
             "source": "database",
-            "options": formatted_options
-        }
+            "options": _format_filter_options(options)
+        })
+        return _etag_response(encoded, if_none_match)
 
     except Exception as e:
-        print(f"ERROR in get_filter_options: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_filter_options")
         return {
             "status": "error",
             "error": str(e)
@@ -563,138 +788,204 @@ async def get_filter_options():
 
 
 
-@app.post("/db/query")
-async def execute_filtered_query(request: FilterRequest):
-    """Execute a filtered query against the database"""
-    start_time = time.time()
+# /db/query filter keys and the cla_volume_composites column each one matches
+_QUERY_FILTER_COLUMNS = {
+    'lineOfBusiness': 'LineOfBusinessID',
+    'commitmentSizeGroup': 'CommitmentSizeGroup',
+    'riskGroup': 'RiskGroupDescription',
+    'region': 'Region',
+}
 
-    try:
-        # Check if we have a database connection
-        from main import get_db_connection
-        conn = get_db_connection()
-        if not conn:
-            return QueryResponse(
-                status="error",
-                error="Database connection not available"
-            )
+@functools.lru_cache(maxsize=64)
+def _compile_query(filter_keys: tuple, has_ranges: bool, has_limit: bool) -> str:
+    """/db/query SQL for a given filter shape, with every value left as a named parameter"""
+    where_conditions = [f"{_QUERY_FILTER_COLUMNS[key]} = ANY(%({key})s)" for key in filter_keys]
+    if has_ranges:
+        where_conditions.append(
+            "EXISTS (SELECT 1 FROM unnest(%(range_min)s::float8[], %(range_max)s::float8[]) AS r(lo, hi)"
+            " WHERE CommitmentAmt >= r.lo AND CommitmentAmt <= r.hi)"
+        )
 
-        # Build the SQL query with filters
-        where_conditions = []
-        params = {}
-        param_counter = 1
-
-        # Build WHERE conditions for each filter type
-        if request.filters.get('lineOfBusiness'):
-            placeholders = []
-            for lob in request.filters['lineOfBusiness']:
-                param_name = f"lob_{param_counter}"
-                params[param_name] = lob
-                placeholders.append(f":{param_name}")
-                param_counter += 1
-            where_conditions.append(f"LineOfBusinessID IN ({','.join(placeholders)})")
-
-        if request.filters.get('commitmentSizeGroup'):
-            placeholders = []
-            for csg in request.filters['commitmentSizeGroup']:
-                param_name = f"csg_{param_counter}"
-                params[param_name] = csg
-                placeholders.append(f":{param_name}")
-                param_counter += 1
-            where_conditions.append(f"CommitmentSizeGroup IN ({','.join(placeholders)})")
-
-        if request.filters.get('riskGroup'):
-            placeholders = []
-            for rg in request.filters['riskGroup']:
-                param_name = f"rg_{param_counter}"
-                params[param_name] = rg
-                placeholders.append(f":{param_name}")
-                param_counter += 1
-            where_conditions.append(f"RiskGroupDescription IN ({','.join(placeholders)})")
-
-        if request.filters.get('region'):
-            placeholders = []
-            for region in request.filters['region']:
-                param_name = f"region_{param_counter}"
-                params[param_name] = region
-                placeholders.append(f":{param_name}")
-                param_counter += 1
-            where_conditions.append(f"Region IN ({','.join(placeholders)})")
-
-        # Handle custom commitment ranges
-        if request.customCommitmentRanges:
-            range_conditions = []
-            for i, range_obj in enumerate(request.customCommitmentRanges):
-                min_param = f"range_min_{i}"
-                max_param = f"range_max_{i}"
-                params[min_param] = range_obj['min']
-                params[max_param] = range_obj['max']
-                range_conditions.append(f"(CommitmentAmt >= :{min_param} AND CommitmentAmt <= :{max_param})")
-
-            if range_conditions:
-                where_conditions.append(f"({' OR '.join(range_conditions)})")
-
-        # Build the main query
-        base_query = """
+    query = """
         SELECT 
             ProcessingDateKey,
             LineOfBusinessID,
             CommitmentSizeGroup,
             RiskGroupDescription,
             Region,
-            COUNT(*) as RecordCount,
-            SUM(CommitmentAmt) as TotalCommitment,
-            AVG(CommitmentAmt) as AvgCommitment,
-            MIN(CommitmentAmt) as MinCommitment,
-            MAX(CommitmentAmt) as MaxCommitment
+            COUNT(*) as "RecordCount",
+            SUM(CommitmentAmt) as "TotalCommitment",
+            AVG(CommitmentAmt) as "AvgCommitment",
+            MIN(CommitmentAmt) as "MinCommitment",
+            MAX(CommitmentAmt) as "MaxCommitment"
         FROM cla_volume_composites
         """
 
-        if where_conditions:
-            base_query += f" WHERE {' AND '.join(where_conditions)}"
+    if where_conditions:
+        query += f" WHERE {' AND '.join(where_conditions)}"
 
-        base_query += """
+    query += """
         GROUP BY ProcessingDateKey, LineOfBusinessID, CommitmentSizeGroup, RiskGroupDescription, Region
-        ORDER BY ProcessingDateKey DESC, TotalCommitment DESC
+        ORDER BY ProcessingDateKey DESC, "TotalCommitment" DESC
         """
 
-        if request.row_limit:
-            base_query += f" LIMIT {request.row_limit}"
+    if has_limit:
+        query += " LIMIT %(row_limit)s"
+    return query
+
+
+# /db/query results above this many rows are streamed instead of built as one list
+QUERY_STREAM_THRESHOLD = 5_000
+
 
-        # Execute query using polars for better performance
+def _run_filtered_query(query: str, params: Dict[str, Any]) -> Optional[pl.DataFrame]:
+    """Result frame for a /db/query statement, or None if no connection is available"""
+    with db_connection() as conn:
+        if not conn:
+            return None
+        execute_options = {"parameters": params or None}
         try:
-            df = read_sql_polars(conn, base_query, params if params else None)
-            results = df.to_dicts()
-        except:
-            # Fallback to pandas if polars fails
-            df = pd.read_sql(base_query, conn, params=params if params else None)
-            results = df.to_dict('records')
+            return pl.read_database(query, connection=conn, execute_options=execute_options)
+        except (pl.exceptions.ComputeError, pl.exceptions.SchemaError):
+            # Mixed-type columns can trip the sampled inference; retry once inferring over every row
+            conn.rollback()
+            return pl.read_database(query, connection=conn, execute_options=execute_options, infer_schema_length=None)
 
-        # Calculate summary statistics
-        total_records = len(results)
-        total_commitment = sum(row.get('TotalCommitment', 0) for row in results if row.get('TotalCommitment'))
 
-        conn.close()
-        execution_time = round((time.time() - start_time) * 1000, 2)
+def _stream_query_response(df: pl.DataFrame, results_tail: Dict[str, Any], execution_time: float) -> StreamingResponse:
+    """QueryResponse-shaped JSON with the rows written slice by slice"""
+    def body() -> Iterator[bytes]:
+        yield b'{"status":"success","results":{"rows":['
+        first = True
+        for batch in df.iter_slices(n_rows=10_000):
+            rows = batch.write_json().encode()[1:-1]
+            if rows:
+                yield rows if first else b',' + rows
+                first = False
+        yield (b'],' + orjson.dumps(results_tail)[1:-1] + b'},"error":null,"execution_time":'
+               + orjson.dumps(execution_time) + b'}')
+
+    return StreamingResponse(body(), media_type="application/json")
+
+
+# Normalized /db/query request -> (expires_at, results); entries outlive their TTL so they can
+# be served stale when the database is down, LFU eviction keeps the popular ones
+_QUERY_CACHE: LFUCache = LFUCache(maxsize=256)
+_QUERY_CACHE_LOCK = threading.Lock()
+
+
+_ISO_NOW = [0, ""]  # [epoch second, its ISO string]
+
+
+def _iso_now() -> str:
+    """Local ISO timestamp at one-second resolution, formatted at most once per second"""
+    now = int(time.time())
+    if now != _ISO_NOW[0]:
+        _ISO_NOW[1] = datetime.fromtimestamp(now).isoformat()
+        _ISO_NOW[0] = now
+    return _ISO_NOW[1]
+
+
+def _query_cache_key(request: FilterRequest) -> str:
+    payload = {"f": request.filters, "r": request.customCommitmentRanges, "lim": request.row_limit}
+    return hashlib.sha1(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
 
+
+@app.post("/db/query")
+async def execute_filtered_query(request: FilterRequest):
+    """Execute a filtered query against the database"""
+    start_time = time.time()
+
+    # An empty payload would aggregate every row of the table; answer from the cached overview instead
+    if not any(request.filters.get(key) for key in _QUERY_FILTER_COLUMNS) and not request.customCommitmentRanges:
+        try:
+            overview = await _overview()
+        except Exception as e:
+            logger.warning("Overview for empty /db/query failed: %s", e)
+            overview = None
         return QueryResponse(
             status="success",
             results={
-                "rows": results,
-                "totalRecords": total_records,
-                "totalCommitment": total_commitment,
-                "executionTime": execution_time,
-                "query": {
-                    "filters": request.filters,
-                    "customRanges": request.customCommitmentRanges,
-                    "timestamp": datetime.now().isoformat()
-                }
+                "rows": [],
+                "totalRecords": 0,
+                "totalCommitment": 0.0,
+                "overview": overview,
+                "message": "Select at least one filter or commitment range to query"
             },
+            execution_time=round((time.time() - start_time) * 1000, 2)
+        )
+
+    cache_key = _query_cache_key(request)
+    with _QUERY_CACHE_LOCK:
+        cached = _QUERY_CACHE.get(cache_key)
+    if cached is not None and time.monotonic() < cached[0]:
+        return QueryResponse(
+            status="success",
+            results=cached[1],
+            execution_time=round((time.time() - start_time) * 1000, 2)
+        )
+
+    try:
+        # Only the filter shape decides the SQL text; values are all bound parameters
+        params = {key: request.filters[key] for key in _QUERY_FILTER_COLUMNS if request.filters.get(key)}
+
+        # Custom commitment ranges: a row matches if it falls in any (min, max) pair
+        if request.customCommitmentRanges:
+            params["range_min"] = [range_obj['min'] for range_obj in request.customCommitmentRanges]
+            params["range_max"] = [range_obj['max'] for range_obj in request.customCommitmentRanges]
+
+        if request.row_limit:
+            params["row_limit"] = request.row_limit
+
+        base_query = _compile_query(
+            tuple(key for key in _QUERY_FILTER_COLUMNS if key in params),
+            bool(request.customCommitmentRanges),
+            bool(request.row_limit),
+        )
+
+        df = await asyncio.to_thread(_run_filtered_query, base_query, params)
+        if df is None:
+            raise ConnectionError("Database connection not available")
+
+        # Calculate summary statistics
+        total_records = df.height
+        total_commitment = float(df["TotalCommitment"].sum() or 0) if total_records else 0.0
+
+        execution_time = round((time.time() - start_time) * 1000, 2)
+        results_tail = {
+            "totalRecords": total_records,
+            "totalCommitment": total_commitment,
+            "executionTime": execution_time,
+            "query": {
+                "filters": request.filters,
+                "customRanges": request.customCommitmentRanges,
+                "timestamp": _iso_now()
+            }
+        }
+
+        if total_records > QUERY_STREAM_THRESHOLD:
+            return _stream_query_response(df, results_tail, execution_time)
+
+        results = {"rows": df.rows(named=True), **results_tail}
+        with _QUERY_CACHE_LOCK:
+            _QUERY_CACHE[cache_key] = (time.monotonic() + CACHE_TTL_NORMAL, results)
+
+        return QueryResponse(
+            status="success",
+            results=results,
             execution_time=execution_time
         )
 
     except Exception as e:
         execution_time = round((time.time() - start_time) * 1000, 2)
-        print(f"Error executing query: {str(e)}")
+        logger.warning("Error executing query: %s", e)
+        if cached is not None:
+            return QueryResponse(
+                status="success",
+                results=cached[1],
+                execution_time=execution_time,
+                stale=True
+            )
         return QueryResponse(
             status="error",
             error=str(e),
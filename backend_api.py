@@ -4,21 +4,63 @@ Updated FastAPI backend for Volume Composites Dashboard
 Connects to PostgreSQL database created from sample.csv
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTasks
+from pydantic import BaseModel, ValidationError
+from typing import Optional, List, Dict, Any, AsyncIterator, Iterator, Sequence
+from collections import OrderedDict
+from cachetools import TTLCache
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import io
+import itertools
+import multiprocessing
+import orjson
 import psycopg2
-import pandas as pd
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.pool
 import os
-from datetime import datetime
+import re
+import threading
+from datetime import date, datetime
 from dotenv import load_dotenv
 import polars as pl
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Volume Composites API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Open the pool's minconn connections now rather than on the first request
+    try:
+        await asyncio.to_thread(get_db_pool)
+    except psycopg2.Error as e:
+        print(f"Database pool not ready at startup: {e}")
+    refresh_task = asyncio.create_task(_refresh_materialized_views_loop())
+    await _start_notify_listener()
+    if _DB_POOL is not None:
+        # Prime both dashboard caches together so the first page load is already a hit
+        warm = GatherBackgroundTasks()
+        warm.add_task(_warm_cache, get_filter_options)
+        warm.add_task(_warm_cache, get_summary_stats)
+        await warm()
+    yield
+    _stop_notify_listener()
+    refresh_task.cancel()
+    close_db_pool()
+
+
+app = FastAPI(
+    title="Volume Composites API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # CORS middleware for frontend connection
 app.add_middleware(
@@ -43,16 +85,367 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', 'password')
 }
 
-def get_db_connection():
-    """Create database connection"""
+# Server-side prepared statements kept per connection before the least recently used is deallocated
+STATEMENT_CACHE_SIZE = 200
+
+
+# numeric columns decode straight to float, so rows serialize without a per-value Decimal check
+DEC2FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values,
+    'DEC2FLOAT',
+    lambda value, cursor: float(value) if value is not None else None,
+)
+
+
+class _PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers the statements it has PREPAREd (SQL text -> statement name)"""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.statement_cache: OrderedDict = OrderedDict()
+        self.holds_slot = False
+        psycopg2.extensions.register_type(DEC2FLOAT, self)
+
+
+# Connections each worker holds outside its pool: the NOTIFY listener and the view-refresh connection
+_DEDICATED_CONNECTIONS = 2
+# Smallest pool worth running a worker with: request slots plus the health-check headroom below
+MIN_WORKER_POOL = 4
+
+
+def _worker_count() -> int:
+    """Worker processes sharing the budget: API_WORKERS, else the WEB_CONCURRENCY uvicorn and gunicorn read"""
+    workers = os.getenv('API_WORKERS') or os.getenv('WEB_CONCURRENCY')
+    if workers:
+        return int(workers)
+    if multiprocessing.parent_process() is not None:
+        # A worker spawned by `uvicorn --workers N` that was not told N would take the whole budget
+        print("⚠️  API_WORKERS is not set in a worker process; this worker assumes it is the only one "
+              "and sizes its pool from all of DB_POOL_MAX. Set API_WORKERS to the worker count.")
+    return 1
+
+
+# DB_POOL_MAX is the connection budget for the whole server; each worker process gets an equal
+# share, less its dedicated connections (the launcher caps workers so that share stays useful)
+DB_CONNECTION_BUDGET = int(os.getenv('DB_POOL_MAX', '20'))
+DB_POOL_MAX = max(1, DB_CONNECTION_BUDGET // _worker_count() - _DEDICATED_CONNECTIONS)
+
+# ThreadedConnectionPool raises PoolError when exhausted; request handlers wait for one of these
+# slots instead, and the two connections left over stay free for health checks
+_DB_SLOTS = threading.BoundedSemaphore(max(1, DB_POOL_MAX - 2))
+DB_ACQUIRE_TIMEOUT = float(os.getenv('DB_ACQUIRE_TIMEOUT', '10'))
+
+_DB_POOL: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+_DB_POOL_LOCK = threading.Lock()
+
+
+def get_db_pool() -> Optional[psycopg2.pool.ThreadedConnectionPool]:
+    """Return the process-wide connection pool, creating it on first use"""
+    global _DB_POOL
+    if _DB_POOL is not None:
+        return _DB_POOL
+    with _DB_POOL_LOCK:
+        if _DB_POOL is None:
+            _DB_POOL = psycopg2.pool.ThreadedConnectionPool(
+                minconn=min(int(os.getenv('DB_POOL_MIN', '2')), DB_POOL_MAX),
+                maxconn=DB_POOL_MAX,
+                connection_factory=_PooledConnection,
+                **DB_CONFIG
+            )
+    return _DB_POOL
+
+
+def get_db_connection(bounded: bool = True):
+    """Borrow a read-only connection from the pool; hand it back with release_db_connection()
+
+    bounded connections queue for a request slot (up to DB_ACQUIRE_TIMEOUT) rather than failing
+    outright when the pool is busy; health checks pass bounded=False to use the reserved headroom.
+    """
+    if bounded and not _DB_SLOTS.acquire(timeout=DB_ACQUIRE_TIMEOUT):
+        return None
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        conn.set_session(readonly=True)
+        conn = get_db_pool().getconn()
+        # Read-only autocommit: no BEGIN/ROLLBACK round trips, and no backend left idle in transaction
+        if not conn.autocommit:
+            conn.set_session(readonly=True, autocommit=True)
+        conn.holds_slot = bounded
         return conn
     except psycopg2.Error:
+        if bounded:
+            _DB_SLOTS.release()
         # Prefer explicit error handling in endpoints
         return None
 
+
+def release_db_connection(conn) -> None:
+    """Return a connection to the pool, discarding it if it has been closed"""
+    if conn is None:
+        return
+    if conn.holds_slot:
+        conn.holds_slot = False
+        _DB_SLOTS.release()
+    if _DB_POOL is not None:
+        _DB_POOL.putconn(conn, close=bool(conn.closed))
+
+
+def close_db_pool() -> None:
+    """Close every pooled connection, e.g. on application shutdown"""
+    global _DB_POOL
+    with _DB_POOL_LOCK:
+        if _DB_POOL is not None:
+            _DB_POOL.closeall()
+            _DB_POOL = None
+
+
+_PLACEHOLDER_RE = re.compile(r'%s')
+
+
+def _execute_prepared(cursor, sql: str, params: Sequence[Any] = ()) -> None:
+    """Run sql as a server-side prepared statement, PREPAREd once per pooled connection"""
+    cache = cursor.connection.statement_cache
+    name = cache.get(sql)
+    if name is None:
+        name = 'stmt_' + hashlib.sha1(sql.encode()).hexdigest()[:16]
+        numbered = itertools.count(1)
+        cursor.execute(f"PREPARE {name} AS " + _PLACEHOLDER_RE.sub(lambda _: f"${next(numbered)}", sql))
+        cache[sql] = name
+        if len(cache) > STATEMENT_CACHE_SIZE:
+            _, evicted = cache.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {evicted}")
+    else:
+        cache.move_to_end(sql)
+
+    if params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+
+# Cached responses live until a NOTIFY on this channel says the source table changed
+NOTIFY_CHANNEL = 'analytics_changed'
+
+# Sent by whichever worker refreshed the materialized views, so every worker drops what it cached meanwhile
+REFRESHED_CHANNEL = 'analytics_refreshed'
+
+# A load NOTIFYs once per statement; the views are refreshed once the burst has been quiet this long (seconds)
+NOTIFY_DEBOUNCE_SECONDS = float(os.getenv('NOTIFY_DEBOUNCE_SECONDS', '2'))
+
+# Safety net for when the LISTEN connection is down; NOTIFY normally invalidates long before this
+RESPONSE_CACHE_MAX_AGE = int(os.getenv('RESPONSE_CACHE_MAX_AGE', '3600'))
+
+_MISSING = object()
+
+
+# /api/query bodies kept per distinct (filters, limit); least recently used entries go first
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '128'))
+# Capped-analysis bodies per (filters, BusinessConfig thresholds)
+CAPPED_ANALYSIS_CACHE_SIZE = int(os.getenv('CAPPED_ANALYSIS_CACHE_SIZE', '32'))
+
+
+class ResponseCache:
+    """One TTLCache per cached endpoint; the fixed slots make a mistyped key an AttributeError"""
+
+    __slots__ = ('filter_options', 'summary_stats', 'query', 'capped_analysis', '_lock')
+
+    def __init__(self, max_age: float) -> None:
+        self.filter_options: TTLCache = TTLCache(maxsize=1, ttl=max_age)
+        self.summary_stats: TTLCache = TTLCache(maxsize=1, ttl=max_age)
+        self.query: TTLCache = TTLCache(maxsize=QUERY_CACHE_SIZE, ttl=max_age)
+        self.capped_analysis: TTLCache = TTLCache(maxsize=CAPPED_ANALYSIS_CACHE_SIZE, ttl=max_age)
+        self._lock = threading.Lock()  # TTLCache is not thread-safe on its own
+
+    def get(self, key: str, entry: Any = None) -> Any:
+        """Cached value for key (or one entry of a multi-entry slot), or _MISSING; a stored empty or None result is still a hit"""
+        with self._lock:
+            return getattr(self, key).get(key if entry is None else entry, _MISSING)
+
+    def set(self, key: str, value: Any, entry: Any = None) -> None:
+        with self._lock:
+            getattr(self, key)[key if entry is None else entry] = value
+
+    def clear(self) -> None:
+        """Empty every slot in place, so nothing holding a slot ends up writing to a detached cache"""
+        with self._lock:
+            self.filter_options.clear()
+            self.summary_stats.clear()
+            self.query.clear()
+            self.capped_analysis.clear()
+
+
+_RESPONSE_CACHE = ResponseCache(RESPONSE_CACHE_MAX_AGE)
+
+
+# Only one request per worker rebuilds an expired entry; the rest wait and read its result
+_CACHE_FILL_LOCKS = {'filter_options': asyncio.Lock(), 'summary_stats': asyncio.Lock()}
+
+
+def get_cached_response(key: str, entry: Any = None) -> Any:
+    """Cached value for key, or _MISSING if absent or past RESPONSE_CACHE_MAX_AGE"""
+    return _RESPONSE_CACHE.get(key, entry)
+
+
+def set_cached_response(key: str, value: Any, entry: Any = None) -> None:
+    _RESPONSE_CACHE.set(key, value, entry)
+
+
+def cache_encoded_response(key: str, payload: Any) -> tuple:
+    """Encode payload once and cache (body, etag) so hits skip serialization and can answer 304s"""
+    body = orjson.dumps(payload)
+    encoded = (body, f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"')
+    set_cached_response(key, encoded)
+    return encoded
+
+
+def etag_response(encoded: tuple, if_none_match: Optional[str]) -> Response:
+    """Cached JSON body with its ETag, or an empty 304 when the client already has it"""
+    body, etag = encoded
+    # no-cache: clients revalidate every time, which is cheap, and NOTIFY invalidation stays exact
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match:
+        candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        if etag in candidates or '*' in candidates:
+            return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def clear_response_cache() -> None:
+    _RESPONSE_CACHE.clear()
+
+
+# Delay before re-opening a lost LISTEN connection, doubling per failed attempt up to the max (seconds)
+NOTIFY_RECONNECT_SECONDS = 1.0
+NOTIFY_RECONNECT_MAX_SECONDS = 60.0
+
+# The live LISTEN connection and the file descriptor its reader is registered on; None while down
+_LISTENER: List[Any] = [None, None]
+_LISTENER_RECONNECT: List[Optional[asyncio.Task]] = [None]
+
+
+def _open_notify_listener():
+    """Dedicated autocommit connection LISTENing on NOTIFY_CHANNEL and REFRESHED_CHANNEL"""
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}; LISTEN {REFRESHED_CHANNEL}")
+    except psycopg2.Error:
+        conn.close()
+        raise
+    return conn
+
+
+async def _start_notify_listener() -> None:
+    """Clear the response cache whenever the source table NOTIFYs; keeps retrying if LISTEN is unavailable"""
+    try:
+        conn = await asyncio.to_thread(_open_notify_listener)
+    except psycopg2.Error as e:
+        print(f"Cache invalidation listener unavailable, relying on max age until it connects: {e}")
+        _schedule_listener_reconnect(asyncio.get_running_loop())
+        return
+    _register_notify_listener(asyncio.get_running_loop(), conn)
+
+
+def _stop_notify_listener() -> None:
+    task = _LISTENER_RECONNECT[0]
+    if task is not None:
+        task.cancel()
+    _close_notify_listener(asyncio.get_running_loop())
+
+
+def _close_notify_listener(loop: asyncio.AbstractEventLoop) -> None:
+    """Unregister and close the LISTEN connection, which may already be dead"""
+    conn, fd = _LISTENER
+    _LISTENER[:] = [None, None]
+    if fd is not None:
+        # By descriptor, as fileno() raises once the connection is closed
+        loop.remove_reader(fd)
+    if conn is not None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+def _schedule_listener_reconnect(loop: asyncio.AbstractEventLoop) -> None:
+    task = _LISTENER_RECONNECT[0]
+    if task is None or task.done():
+        _LISTENER_RECONNECT[0] = loop.create_task(_reconnect_notify_listener())
+
+
+async def _reconnect_notify_listener() -> None:
+    """Re-open LISTEN with exponential backoff, then drop whatever was cached while NOTIFYs were missed"""
+    delay = NOTIFY_RECONNECT_SECONDS
+    while True:
+        await asyncio.sleep(delay)
+        try:
+            conn = await asyncio.to_thread(_open_notify_listener)
+        except psycopg2.Error as e:
+            delay = min(delay * 2, NOTIFY_RECONNECT_MAX_SECONDS)
+            print(f"Cache invalidation listener reconnect failed, retrying in {delay:g}s: {e}")
+            continue
+        _register_notify_listener(asyncio.get_running_loop(), conn)
+        clear_response_cache()
+        print("Cache invalidation listener reconnected")
+        return
+
+
+def _register_notify_listener(loop: asyncio.AbstractEventLoop, conn) -> None:
+    fd = conn.fileno()
+    _LISTENER[:] = [conn, fd]
+
+    def on_readable() -> None:
+        try:
+            conn.poll()
+        except psycopg2.Error as e:
+            print(f"Cache invalidation listener lost, reconnecting: {e}")
+            _close_notify_listener(loop)
+            clear_response_cache()
+            _schedule_listener_reconnect(loop)
+            return
+        if not conn.notifies:
+            return
+        source_changed = any(notify.channel == NOTIFY_CHANNEL for notify in conn.notifies)
+        conn.notifies.clear()
+        clear_response_cache()
+        if source_changed:
+            _LAST_SOURCE_CHANGE[0] = loop.time()
+            _schedule_source_refresh(loop)
+
+    loop.add_reader(fd, on_readable)
+
+
+_BACKGROUND_TASKS: set = set()
+
+# Loop time of the latest NOTIFY_CHANNEL notification, and the task refreshing the views for it
+_LAST_SOURCE_CHANGE = [0.0]
+_SOURCE_REFRESH_TASK: List[Optional[asyncio.Task]] = [None]
+
+
+def _schedule_source_refresh(loop: asyncio.AbstractEventLoop) -> None:
+    """Start the debounced refresh unless one is already pending, which then picks this change up"""
+    task = _SOURCE_REFRESH_TASK[0]
+    if task is not None and not task.done():
+        return
+    task = loop.create_task(_on_source_changed())
+    _SOURCE_REFRESH_TASK[0] = task
+    _BACKGROUND_TASKS.add(task)
+    task.add_done_callback(_BACKGROUND_TASKS.discard)
+
+
+async def _on_source_changed() -> None:
+    """Refresh the materialized views once notifications go quiet, again if more arrived meanwhile"""
+    loop = asyncio.get_running_loop()
+    while True:
+        while (wait := _LAST_SOURCE_CHANGE[0] + NOTIFY_DEBOUNCE_SECONDS - loop.time()) > 0:
+            await asyncio.sleep(wait)
+        started = loop.time()
+        try:
+            await asyncio.to_thread(_refresh_materialized_views)
+        except psycopg2.Error as e:
+            print(f"Materialized view refresh failed: {e}")
+        if _LAST_SOURCE_CHANGE[0] < started:
+            return
+
+
 # Pydantic models
 class DateFilterModel(BaseModel):
     operator: str  # 'equals' | 'greaterThan' | 'lessThan' | 'between'
@@ -77,9 +470,75 @@ class QueryRequest(BaseModel):
 
 # API Endpoints
 
-def _build_where_conditions_from_filters(filters: FilterRequest) -> tuple[list[str], list[Any]]:
+_DATE_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+
+
+def _parse_date(value: str) -> date:
+    """Calendar date from the date part of an ISO string, without fromisoformat or timezone handling"""
+    m = _DATE_RE.match(value)
+    if m is None:
+        raise ValueError(f"Invalid ISO date: {value!r}")
+    return date(int(m[1]), int(m[2]), int(m[3]))
+
+
+def _date_key(value: date) -> int:
+    """YYYYMMDD integer matching "ProcessingDateKey" """
+    return value.year * 10000 + value.month * 100 + value.day
+
+
+# sbaClassification values and their conditions; the SBA line of business id is a literal, not a parameter
+_SBA_CONDITIONS = {
+    'sba': '"LineofBusinessId" = \'12\'',
+    'non-sba': '"LineofBusinessId" <> \'12\'',
+}
+
+
+# FilterRequest list fields and the condition each one adds; dimension-backed filters resolve the
+# labels to smallint keys in a tiny lookup, then match the fact table on its 2-byte key column
+_LIST_FILTER_CONDITIONS = {
+    'commitmentSizeGroup': '"CommitmentSizeGroupId" = ANY(SELECT "CommitmentSizeGroupId" FROM '
+                           'cla_uat.dim_commitment_size_group WHERE "CommitmentSizeGroup" = ANY(%s::text[]))',
+    'riskGroup': '"RiskGroupId" = ANY(SELECT "RiskGroupId" FROM cla_uat.dim_risk_group '
+                 'WHERE "RiskGroupDesc" = ANY(%s::text[]))',
+    'bankId': '"BankID" = ANY(%s::text[])',
+    'region': '"RegionId" = ANY(SELECT "RegionId" FROM cla_uat.dim_region WHERE "Region" = ANY(%s::text[]))',
+    'naicsGrpName': '"NAICSGrpId" = ANY(SELECT "NAICSGrpId" FROM cla_uat.dim_naics_group '
+                    'WHERE "NAICSGrpName" = ANY(%s::text[]))',
+}
+
+# The same filters on the original text columns, for sources without the dimension keys
+_LEGACY_LIST_FILTER_CONDITIONS = {
+    'commitmentSizeGroup': '"CommitmentSizeGroup" = ANY(%s::text[])',
+    'riskGroup': '"RiskGroupDesc" = ANY(%s::text[])',
+    'bankId': '"BankID" = ANY(%s::text[])',
+    'region': '"Region" = ANY(%s::text[])',
+    'naicsGrpName': '"NAICSGrpName" = ANY(%s::text[])',
+}
+
+# Raised when the source lacks the columns or tables the key-based and date filters use (an existing
+# view built before mock_db_setup.sql added them)
+_SCHEMA_ERRORS = (psycopg2.errors.UndefinedColumn, psycopg2.errors.UndefinedTable)
+
+# Set on the first _SCHEMA_ERRORS hit; from then on every query goes straight to the legacy filters
+_LEGACY_SCHEMA = [False]
+
+
+def _with_schema_fallback(run):
+    """run(legacy) on the schema detected so far, switching to legacy filters for good if it lacks the keys"""
+    if not _LEGACY_SCHEMA[0]:
+        try:
+            return run(False)
+        except _SCHEMA_ERRORS as e:
+            print(f"Source lacks dimension keys or ProcessingDate, using legacy filters: {e}")
+            _LEGACY_SCHEMA[0] = True
+    return run(True)
+
+
+def _build_where_conditions_from_filters(filters: FilterRequest, legacy: bool = False) -> tuple[list[str], list[Any]]:
     """Convert FilterRequest into SQL WHERE conditions and parameters.
 
+    legacy=True filters on the original columns only (text labels, integer "ProcessingDateKey"),
+    for sources without the dimension keys or the generated "ProcessingDate".
     Returns a tuple: (conditions, params)
     """
     where_conditions: list[str] = []
@@ -87,89 +546,68 @@ def _build_where_conditions_from_filters(filters: FilterRequest) -> tuple[list[s
 
     # SBA classification (LOB id '12' assumed to be SBA)
     if filters.sbaClassification:
-        sba_conditions: list[str] = []
-        for classification in filters.sbaClassification:
-            cls = classification.lower()
-            if cls == 'sba':
-                sba_conditions.append('"LineofBusinessId" = %s')
-                params.append('12')
-            elif cls == 'non-sba':
-                sba_conditions.append('"LineofBusinessId" != %s')
-                params.append('12')
+        sba_conditions = [
+            _SBA_CONDITIONS[cls] for cls in
+            dict.fromkeys(classification.lower() for classification in filters.sbaClassification)
+            if cls in _SBA_CONDITIONS
+        ]
         if sba_conditions:
             where_conditions.append(f"({' OR '.join(sba_conditions)})")
 
     # Line of business (supports values like "11 - Commercial" and raw IDs)
     if filters.lineOfBusiness:
         lob_ids = [lob.split(' - ')[0] if ' - ' in lob else lob for lob in filters.lineOfBusiness]
-        placeholders = ','.join(['%s'] * len(lob_ids))
-        where_conditions.append(f'"LineofBusinessId" IN ({placeholders})')
-        params.extend(lob_ids)
-
-    # Commitment size group
-    if filters.commitmentSizeGroup:
-        placeholders = ','.join(['%s'] * len(filters.commitmentSizeGroup))
-        where_conditions.append(f'"CommitmentSizeGroup" IN ({placeholders})')
-        params.extend(filters.commitmentSizeGroup)
-
-    # Risk group
-    if filters.riskGroup:
-        placeholders = ','.join(['%s'] * len(filters.riskGroup))
-        where_conditions.append(f'"RiskGroupDesc" IN ({placeholders})')
-        params.extend(filters.riskGroup)
-
-    # Bank ID
-    if filters.bankId:
-        placeholders = ','.join(['%s'] * len(filters.bankId))
-        where_conditions.append(f'"BankID" IN ({placeholders})')
-        params.extend(filters.bankId)
-
-    # Region
-    if filters.region:
-        placeholders = ','.join(['%s'] * len(filters.region))
-        where_conditions.append(f'"Region" IN ({placeholders})')
-        params.extend(filters.region)
-
-    # NAICS group name
-    if filters.naicsGrpName:
-        placeholders = ','.join(['%s'] * len(filters.naicsGrpName))
-        where_conditions.append(f'"NAICSGrpName" IN ({placeholders})')
-        params.extend(filters.naicsGrpName)
-
-    # Custom commitment ranges
+        where_conditions.append('"LineofBusinessId" = ANY(%s::text[])')
+        params.append(lob_ids)
+
+    # One array parameter per list filter, so the SQL text does not change with the number of values
+    list_conditions = _LEGACY_LIST_FILTER_CONDITIONS if legacy else _LIST_FILTER_CONDITIONS
+    for field, condition in list_conditions.items():
+        values = getattr(filters, field)
+        if values:
+            where_conditions.append(condition)
+            params.append(values)
+
+    # Custom commitment ranges: a row matches if it falls in any (min, max) pair
     if filters.customCommitmentRanges:
-        range_conditions: list[str] = []
-        for range_filter in filters.customCommitmentRanges:
-            range_conditions.append('("CommitmentAmt" >= %s AND "CommitmentAmt" <= %s)')
-            params.extend([range_filter['min'], range_filter['max']])
-        if range_conditions:
-            where_conditions.append(f"({' OR '.join(range_conditions)})")
-
-    # Date filters on ProcessingDateKey: expects ISO strings; convert to YYYYMMDD integer
+        where_conditions.append(
+            'EXISTS (SELECT 1 FROM unnest(%s::float8[], %s::float8[]) AS r(lo, hi)'
+            ' WHERE "CommitmentAmt" >= r.lo AND "CommitmentAmt" <= r.hi)'
+        )
+        params.append([range_filter['min'] for range_filter in filters.customCommitmentRanges])
+        params.append([range_filter['max'] for range_filter in filters.customCommitmentRanges])
+
+    # Date filters on ProcessingDate: expects ISO strings
     if filters.dateFilters:
         date_conditions: list[str] = []
         for df in filters.dateFilters:
             try:
-                start_str = df.startDate.replace('Z', '+00:00') if isinstance(df.startDate, str) else df.startDate
-                end_str = df.endDate.replace('Z', '+00:00') if (df.endDate and isinstance(df.endDate, str)) else df.endDate
-                start_int = int(datetime.fromisoformat(start_str).strftime('%Y%m%d'))
-                end_int = int(datetime.fromisoformat(end_str).strftime('%Y%m%d')) if end_str else None
-            except (ValueError, TypeError, AttributeError):
+                start_date = _parse_date(df.startDate)
+                end_date = _parse_date(df.endDate) if df.endDate else None
+            except (ValueError, TypeError):
                 continue
 
+            # "ProcessingDate" is generated from the YYYYMMDD key and BRIN-indexed; legacy sources
+            # without it compare the integer key itself
+            if legacy:
+                column = '"ProcessingDateKey"'
+                start_date = _date_key(start_date)
+                end_date = _date_key(end_date) if end_date else None
+            else:
+                column = '"ProcessingDate"'
             op = (df.operator or '').lower()
             if op == 'equals':
-                date_conditions.append('"ProcessingDateKey" = %s')
-                params.append(start_int)
+                date_conditions.append(f'{column} = %s')
+                params.append(start_date)
             elif op == 'greaterthan':
-                date_conditions.append('"ProcessingDateKey" >= %s')
-                params.append(start_int)
+                date_conditions.append(f'{column} >= %s')
+                params.append(start_date)
             elif op == 'lessthan':
-                date_conditions.append('"ProcessingDateKey" <= %s')
-                params.append(start_int)
-            elif op == 'between' and end_int is not None:
-                date_conditions.append('(\"ProcessingDateKey\" BETWEEN %s AND %s)'.replace('\\"','"'))
-                params.extend([start_int, end_int])
+                date_conditions.append(f'{column} <= %s')
+                params.append(start_date)
+            elif op == 'between' and end_date is not None:
+                date_conditions.append(f'({column} BETWEEN %s AND %s)')
+                params.extend([start_date, end_date])
 
         if date_conditions:
             where_conditions.append(f"({' AND '.join(date_conditions)})")
@@ -188,16 +626,17 @@ def root():
 @app.get("/health")
 def health_check():
     """Health check endpoint"""
-    conn = get_db_connection()
+    conn = get_db_connection(bounded=False)
     if conn:
         try:
             cursor = conn.cursor()
             cursor.execute("SELECT 1")
             cursor.close()
-            conn.close()
             db_status = "connected"
         except psycopg2.Error:
             db_status = "error"
+        finally:
+            release_db_connection(conn)
     else:
         db_status = "disconnected"
     
@@ -210,7 +649,7 @@ def health_check():
 @app.get("/api/connection-status")
 def connection_status():
     """Check database connection status for frontend"""
-    conn = get_db_connection()
+    conn = get_db_connection(bounded=False)
     if not conn:
         return {
             "isConnected": False,
@@ -222,14 +661,13 @@ def connection_status():
         cursor = conn.cursor()
         
         # Test query to get some basic info
-        cursor.execute("SELECT COUNT(*) FROM cla_uat.mv_t_cla_input_full_upd")
+        _execute_prepared(cursor, "SELECT COUNT(*) FROM cla_uat.mv_t_cla_input_full_upd")
         record_count = cursor.fetchone()[0]
         
-        cursor.execute('SELECT MAX("ProcessingDateKey") FROM cla_uat.mv_t_cla_input_full_upd')
+        _execute_prepared(cursor, 'SELECT MAX("ProcessingDateKey") FROM cla_uat.mv_t_cla_input_full_upd')
         max_date = cursor.fetchone()[0]
 
         cursor.close()
-        conn.close()
 
         return {
             "isConnected": True,
@@ -240,171 +678,384 @@ def connection_status():
         }
 
     except psycopg2.Error as e:
-        if conn:
-            conn.close()
         return {
             "isConnected": False,
             "error": f"Database query error: {str(e)}",
             "lastConnectionTime": None
         }
+    finally:
+        release_db_connection(conn)
 
-@app.get("/api/filter-options")
-def get_filter_options():
-    """Get all available filter options from database"""
+def _fetch_row(query: str) -> Optional[tuple]:
+    """First row of a prepared query, run on its own pooled connection"""
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
+    try:
+        with conn.cursor() as cursor:
+            _execute_prepared(cursor, query)
+            return cursor.fetchone()
+    finally:
+        release_db_connection(conn)
+
 
+def _fetch_all(query: str) -> List[tuple]:
+    """All rows of a prepared query, run on its own pooled connection"""
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
     try:
-        cursor = conn.cursor()
+        with conn.cursor() as cursor:
+            _execute_prepared(cursor, query)
+            return cursor.fetchall()
+    finally:
+        release_db_connection(conn)
+
+
+# Per-column DISTINCT queries, used when filter_options_mv has not been created yet
+_FILTER_OPTION_QUERIES = {
+    "lineOfBusiness": '''
+        SELECT DISTINCT "LineofBusinessId", "LineofBusiness" 
+        FROM cla_uat.mv_t_cla_input_full_upd 
+        WHERE "LineofBusinessId" IS NOT NULL 
+        ORDER BY "LineofBusinessId"
+    ''',
+    "commitmentSizeGroup": '''
+        SELECT DISTINCT "CommitmentSizeGroup" 
+        FROM cla_uat.mv_t_cla_input_full_upd 
+        WHERE "CommitmentSizeGroup" IS NOT NULL 
+        ORDER BY "CommitmentSizeGroup"
+    ''',
+    "riskGroup": '''
+        SELECT DISTINCT "RiskGroupDesc" 
+        FROM cla_uat.mv_t_cla_input_full_upd 
+        WHERE "RiskGroupDesc" IS NOT NULL 
+        ORDER BY "RiskGroupDesc"
+    ''',
+    "bankId": '''
+        SELECT DISTINCT "BankID" 
+        FROM cla_uat.mv_t_cla_input_full_upd 
+        WHERE "BankID" IS NOT NULL 
+        ORDER BY "BankID"
+    ''',
+    "region": '''
+        SELECT DISTINCT "Region" 
+        FROM cla_uat.mv_t_cla_input_full_upd 
+        WHERE "Region" IS NOT NULL 
+        ORDER BY "Region"
+    ''',
+    "naicsGrpName": '''
+        SELECT DISTINCT "NAICSGrpName"
+        FROM cla_uat.mv_t_cla_input_full_upd 
+        WHERE "NAICSGrpName" IS NOT NULL 
+        ORDER BY "NAICSGrpName"
+    '''
+}
 
-        # Get distinct values for each filter type
-        filter_queries = {
-            "lineOfBusiness": '''
-                SELECT DISTINCT "LineofBusinessId", "LineofBusiness" 
-                FROM cla_uat.mv_t_cla_input_full_upd 
-                WHERE "LineofBusinessId" IS NOT NULL 
-                ORDER BY "LineofBusinessId"
-            ''',
-            "commitmentSizeGroup": '''
-                SELECT DISTINCT "CommitmentSizeGroup" 
-                FROM cla_uat.mv_t_cla_input_full_upd 
-                WHERE "CommitmentSizeGroup" IS NOT NULL 
-                ORDER BY "CommitmentSizeGroup"
-            ''',
-            "riskGroup": '''
-                SELECT DISTINCT "RiskGroupDesc" 
-                FROM cla_uat.mv_t_cla_input_full_upd 
-                WHERE "RiskGroupDesc" IS NOT NULL 
-                ORDER BY "RiskGroupDesc"
-            ''',
-            "bankId": '''
-                SELECT DISTINCT "BankID" 
-                FROM cla_uat.mv_t_cla_input_full_upd 
-                WHERE "BankID" IS NOT NULL 
-                ORDER BY "BankID"
-            ''',
-            "region": '''
-                SELECT DISTINCT "Region" 
-                FROM cla_uat.mv_t_cla_input_full_upd 
-                WHERE "Region" IS NOT NULL 
-                ORDER BY "Region"
-            ''',
-            "naicsGrpName": '''
-                SELECT DISTINCT "NAICSGrpName"
-                FROM cla_uat.mv_t_cla_input_full_upd 
-                WHERE "NAICSGrpName" IS NOT NULL 
-                ORDER BY "NAICSGrpName"
-            '''
-        }
+FILTER_OPTIONS_MV_QUERY = '''
+    SELECT "FilterName", "Value"
+    FROM cla_uat.filter_options_mv
+    ORDER BY "FilterName", "SortKey", "Value"
+'''
+
+# How often the background task refreshes filter_options_mv and summary_stats_mv (seconds)
+FILTER_OPTIONS_REFRESH_SECONDS = int(os.getenv('FILTER_OPTIONS_REFRESH_SECONDS', '300'))
+
+
+def _filter_options_from_mv() -> Dict[str, List[str]]:
+    """Filter option lists read from the pre-aggregated filter_options_mv"""
+    filter_options: Dict[str, List[str]] = {name: [] for name in _FILTER_OPTION_QUERIES}
+    for filter_name, value in _fetch_all(FILTER_OPTIONS_MV_QUERY):
+        filter_options.setdefault(filter_name, []).append(value)
+    return filter_options
+
+
+async def _filter_options_from_table() -> Dict[str, List[str]]:
+    """Filter option lists from one DISTINCT per column, all running at once on separate connections"""
+    results = await asyncio.gather(*(
+        asyncio.to_thread(_fetch_all, query) for query in _FILTER_OPTION_QUERIES.values()
+    ))
+    filter_options: Dict[str, List[str]] = {}
+    for filter_name, rows in zip(_FILTER_OPTION_QUERIES, results):
+        if filter_name == "lineOfBusiness":
+            # Special handling for line of business to include both ID and name
+            filter_options[filter_name] = [
+                f"{row[0]} - {row[1]}" if row[1] else str(row[0])
+                for row in rows
+            ]
+        else:
+            filter_options[filter_name] = [row[0] for row in rows]
+    return filter_options
 
-        filter_options = {}
 
-        # Add SBA classification options (hardcoded as they're based on logic)
-        filter_options["sbaClassification"] = ["SBA", "Non-SBA"]
+# Materialized views backing the cached endpoints; either may be missing on an older schema
+_MATERIALIZED_VIEWS = ('cla_uat.filter_options_mv', 'cla_uat.summary_stats_mv')
 
-        # Execute queries and build filter options
-        for filter_name, query in filter_queries.items():
-            cursor.execute(query)
-            results = cursor.fetchall()
 
-            if filter_name == "lineOfBusiness":
-                # Special handling for line of business to include both ID and name
-                filter_options[filter_name] = [
-                    f"{row[0]} - {row[1]}" if row[1] else str(row[0])
-                    for row in results
-                ]
-            else:
-                filter_options[filter_name] = [row[0] for row in results]
+# Advisory lock held while refreshing, so concurrent workers leave the refresh to whoever got it first
+_REFRESH_LOCK_QUERY = "SELECT pg_try_advisory_lock(hashtext('cla_uat.refresh_materialized_views'))"
+_REFRESH_UNLOCK_QUERY = "SELECT pg_advisory_unlock(hashtext('cla_uat.refresh_materialized_views'))"
 
-        cursor.close()
+
+def _refresh_materialized_views() -> bool:
+    """REFRESH each view on a dedicated writable connection (pooled ones are read-only)
+
+    Returns False without refreshing when another worker holds the refresh lock; the refresh
+    that worker is running covers the same changes and is announced on REFRESHED_CHANNEL.
+    """
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(_REFRESH_LOCK_QUERY)
+            if not cursor.fetchone()[0]:
+                return False
+            try:
+                for view in _MATERIALIZED_VIEWS:
+                    try:
+                        cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+                    except psycopg2.errors.UndefinedTable:
+                        pass
+                cursor.execute(f"NOTIFY {REFRESHED_CHANNEL}")
+            finally:
+                cursor.execute(_REFRESH_UNLOCK_QUERY)
+        return True
+    finally:
         conn.close()
 
-        return filter_options
 
-    except psycopg2.Error as e:
-        if conn:
-            conn.close()
-        raise HTTPException(status_code=500, detail=f"Database query error: {str(e)}") from e
+async def _refresh_materialized_views_loop() -> None:
+    while True:
+        await asyncio.sleep(FILTER_OPTIONS_REFRESH_SECONDS)
+        try:
+            await asyncio.to_thread(_refresh_materialized_views)
+        except psycopg2.Error as e:
+            print(f"Materialized view refresh failed: {e}")
 
 
-@app.post("/api/query")
-def execute_query(request: QueryRequest):
-    """Execute filtered query against the database"""
+@app.get("/api/filter-options")
+async def get_filter_options(if_none_match: Optional[str] = Header(None)):
+    """Get all available filter options from database"""
+    cached = get_cached_response('filter_options')
+    if cached is not _MISSING:
+        return etag_response(cached, if_none_match)
+
+    async with _CACHE_FILL_LOCKS['filter_options']:
+        # Another request may have filled it while this one waited
+        cached = get_cached_response('filter_options')
+        if cached is not _MISSING:
+            return etag_response(cached, if_none_match)
+
+        try:
+            # Add SBA classification options (hardcoded as they're based on logic)
+            filter_options = {"sbaClassification": ["SBA", "Non-SBA"]}
+
+            try:
+                filter_options.update(await asyncio.to_thread(_filter_options_from_mv))
+            except psycopg2.errors.UndefinedTable:
+                filter_options.update(await _filter_options_from_table())
+
+            return etag_response(cache_encoded_response('filter_options', filter_options), if_none_match)
+
+        except psycopg2.Error as e:
+            raise HTTPException(status_code=500, detail=f"Database query error: {str(e)}") from e
+
+
+@app.post("/api/cache/invalidate")
+def invalidate_cache():
+    """Drop every cached response; the next request for each rebuilds it"""
+    clear_response_cache()
+    return {"success": True, "message": "Response cache cleared"}
+
+
+# /api/query requests without a limit or above this many rows are streamed from a server-side cursor
+QUERY_STREAM_THRESHOLD = 5_000
+STREAM_BATCH_ROWS = 1_000
+
+
+# /api/query row order; the LIMIT needs it inside the query and the JSON wrapper repeats it outside,
+# since a subquery's ORDER BY is not guaranteed to carry through
+QUERY_ORDER_BY = '"ProcessingDateKey" DESC, "CommitmentAmt" DESC'
+
+
+def _as_json_rows(query: str, order_by: str) -> str:
+    """Wrap query so Postgres returns each row as a ready-made JSON object in a single text column"""
+    return f"SELECT row_to_json(t)::text FROM ({query}) t ORDER BY {order_by}"
+
+
+def _stream_query_rows(query: str, params: List[Any], query_meta: Dict[str, Any]) -> Iterator[bytes]:
+    """/api/query response written batch by batch, so memory stays at one fetchmany worth of rows"""
     conn = get_db_connection()
     if not conn:
         raise HTTPException(status_code=500, detail="Database connection failed")
-
     try:
-        cursor = conn.cursor()
+        # Server-side cursors live inside a transaction; putconn rolls it back and the next
+        # get_db_connection() switches autocommit on again
+        conn.autocommit = False
+        with conn.cursor(name='api_query_stream') as cursor:
+            cursor.execute(_as_json_rows(query, QUERY_ORDER_BY), params)
+            yield b'{"success":true,"data":['
+            total = 0
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_ROWS)
+                if not rows:
+                    break
+                chunk = ','.join(row[0] for row in rows).encode()
+                yield (b',' if total else b'') + chunk
+                total += len(rows)
+            yield b'],"totalRecords":' + str(total).encode() + b',"query":' + orjson.dumps(query_meta) + b'}'
+    finally:
+        release_db_connection(conn)
+
+
+@app.post("/api/query", openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": {"$ref": "#/components/schemas/QueryRequest"}}},
+    }
+})
+async def execute_query(http_request: Request):
+    """Execute filtered query against the database"""
+    # Validate straight from the raw bytes; pydantic-core parses and builds the model in one pass
+    try:
+        request = QueryRequest.model_validate_json(await http_request.body())
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False, include_input=False)) from e
+    response = await asyncio.to_thread(_execute_query, request)
+    if not isinstance(response, Response):
+        response = ORJSONResponse(response)
 
-        # Build WHERE conditions based on filters
-        where_conditions, params = _build_where_conditions_from_filters(request.filters)
+    # The dashboard asks for these next; re-warm whichever a NOTIFY has cleared once the rows are sent
+    warm = GatherBackgroundTasks()
+    if get_cached_response('summary_stats') is _MISSING:
+        warm.add_task(_warm_cache, get_summary_stats)
+    if get_cached_response('filter_options') is _MISSING:
+        warm.add_task(_warm_cache, get_filter_options)
+    if warm.tasks:
+        response.background = warm
+    return response
 
-        # Build the main query
-        base_query = '''
-        SELECT 
-            "ProcessingDateKey",
-            "CommitmentAmt",
-            "OutstandingAmt",
-            "Region",
-            "NAICSGrpName",
-            "CommitmentSizeGroup",
-            "RiskGroupDesc",
-            "LineofBusinessId",
-            "LineofBusiness",
-            "BankID",
-            "MaturityTermMonths",
-            "SpreadBPS",
-            "YieldPct"
-        FROM cla_uat.mv_t_cla_input_full_upd
-        '''
 
-        if where_conditions:
-            base_query += f" WHERE {' AND '.join(where_conditions)}"
+class GatherBackgroundTasks(BackgroundTasks):
+    """BackgroundTasks that runs its tasks concurrently instead of one after another"""
 
-        base_query += ' ORDER BY "ProcessingDateKey" DESC, "CommitmentAmt" DESC'
+    async def __call__(self) -> None:
+        await asyncio.gather(*(task() for task in self.tasks))
 
-        if request.limit:
-            base_query += f" LIMIT {request.limit}"
 
-        # Execute query
-        cursor.execute(base_query, params)
+async def _warm_cache(endpoint) -> None:
+    # Runs after the response is sent, so a failure only means the next request fills the cache
+    try:
+        await endpoint(if_none_match=None)
+    except HTTPException:
+        pass
+
+
+def _execute_query(request: QueryRequest):
+    return _with_schema_fallback(lambda legacy: _run_query(request, legacy))
+
+
+def _run_query(request: QueryRequest, legacy: bool):
+    # Build WHERE conditions based on filters
+    where_conditions, params = _build_where_conditions_from_filters(request.filters, legacy)
+
+    # Build the main query
+    base_query = '''
+    SELECT 
+        "ProcessingDateKey",
+        "CommitmentAmt"::float8 AS "CommitmentAmt",
+        "OutstandingAmt"::float8 AS "OutstandingAmt",
+        "Region",
+        "NAICSGrpName",
+        "CommitmentSizeGroup",
+        "RiskGroupDesc",
+        "LineofBusinessId",
+        "LineofBusiness",
+        "BankID",
+        "MaturityTermMonths",
+        "SpreadBPS"::float8 AS "SpreadBPS",
+        "YieldPct"::float8 AS "YieldPct"
+    FROM cla_uat.mv_t_cla_input_full_upd
+    '''
+
+    if where_conditions:
+        base_query += f" WHERE {' AND '.join(where_conditions)}"
+
+    base_query += f' ORDER BY {QUERY_ORDER_BY}'
+
+    if request.limit:
+        base_query += " LIMIT %s"
+        params.append(request.limit)
+
+    query_meta = {
+        "filters": request.filters.model_dump(),
+        "limit": request.limit
+    }
 
-        # Get column names
-        columns = [desc[0] for desc in cursor.description]
+    if not request.limit or request.limit > QUERY_STREAM_THRESHOLD:
+        stream = _stream_query_rows(base_query, params, query_meta)
+        try:
+            # Pull the first chunk here so connection and query errors still surface as a 500
+            first = next(stream)
+        except psycopg2.Error as e:
+            if not legacy and isinstance(e, _SCHEMA_ERRORS):
+                raise
+            raise HTTPException(status_code=500, detail=f"Database query error: {str(e)}") from e
+        return StreamingResponse(itertools.chain([first], stream), media_type="application/json")
+
+    # A fixed-size digest keeps keys small however many filter values were selected
+    cache_entry = (hashlib.blake2b(request.filters.model_dump_json().encode(), digest_size=16).digest(), request.limit)
+    cached = get_cached_response('query', cache_entry)
+    if cached is not _MISSING:
+        return Response(cached, media_type="application/json")
 
-        # Fetch results
-        results = cursor.fetchall()
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    try:
+        cursor = conn.cursor()
 
-        # Convert to list of dictionaries
-        data = []
-        for row in results:
-            row_dict = {}
-            for i, value in enumerate(row):
-                # Convert Decimal to float for JSON serialization
-                if hasattr(value, 'quantize'):  # Decimal type
-                    row_dict[columns[i]] = float(value) if value is not None else None
-                else:
-                    row_dict[columns[i]] = value
-            data.append(row_dict)
+        # Execute query; each row comes back as a JSON object built by Postgres
+        _execute_prepared(cursor, _as_json_rows(base_query, QUERY_ORDER_BY), params)
+        results = cursor.fetchall()
 
         cursor.close()
-        conn.close()
-        return {
-            "success": True,
-            "data": data,
-            "totalRecords": len(data),
-            "query": {
-                "filters": request.filters.model_dump(),
-                "limit": request.limit
-            }
-        }
+        body = (b'{"success":true,"data":[' + ','.join(row[0] for row in results).encode()
+                + b'],"totalRecords":' + str(len(results)).encode()
+                + b',"query":' + orjson.dumps(query_meta) + b'}')
+        set_cached_response('query', body, cache_entry)
+        return Response(body, media_type="application/json")
 
     except psycopg2.Error as e:
-        if conn:
-            conn.close()
+        if not legacy and isinstance(e, _SCHEMA_ERRORS):
+            raise
         raise HTTPException(status_code=500, detail=f"Database query error: {str(e)}") from e
+    finally:
+        release_db_connection(conn)
+
+# aggregated_analytics columns served by /api/analytics-data, in SELECT order
+ANALYTICS_DATA_SCHEMA = {
+    'ProcessingDateKey': pl.Int64,
+    'CommitmentAmt': pl.Float64,
+    'Deals': pl.Int64,
+    'OutstandingAmt': pl.Float64,
+    'ProcessingDateKeyPrior': pl.Int64,
+    'CommitmentAmtPrior': pl.Float64,
+    'OutstandingAmtPrior': pl.Float64,
+    'DealsPrior': pl.Int64,
+    'ca_diff': pl.Float64,
+    'oa_diff': pl.Float64,
+    'deals_diff': pl.Float64,
+    'ca_model_diff': pl.Float64,
+    'oa_model_diff': pl.Float64,
+    'deals_model_diff': pl.Float64,
+}
+_ANALYTICS_DATA_COLUMNS = [
+    f'"{name}"::float8 AS "{name}"' if dtype == pl.Float64 else f'"{name}"'
+    for name, dtype in ANALYTICS_DATA_SCHEMA.items()
+]
+
 
 @app.get("/api/analytics-data")
 def get_analytics_data(limit: Optional[int] = None):
@@ -416,40 +1067,35 @@ def get_analytics_data(limit: Optional[int] = None):
     try:
         cursor = conn.cursor()
 
-        query = 'SELECT * FROM aggregated_analytics ORDER BY "ProcessingDateKey"'
+        # Explicit float8 casts so numeric columns never come back as Decimal
+        query = f'''
+            SELECT {', '.join(_ANALYTICS_DATA_COLUMNS)}
+            FROM aggregated_analytics
+            ORDER BY "ProcessingDateKey"
+        '''
 
+        params = []
         if limit:
-            query += f" LIMIT {limit}"
-
-        cursor.execute(query)
-        columns = [desc[0] for desc in cursor.description]
-        results = cursor.fetchall()
+            query += " LIMIT %s"
+            params.append(limit)
 
-        # Convert to list of dictionaries
-        data = []
-        for row in results:
-            row_dict = {}
-            for i, value in enumerate(row):
-                # Convert Decimal to float for JSON serialization
-                if hasattr(value, 'quantize'):  # Decimal type
-                    row_dict[columns[i]] = float(value) if value is not None else None
-                else:
-                    row_dict[columns[i]] = value
-            data.append(row_dict)
+        # Bulk COPY skips per-row tuple construction; Polars parses the CSV in one vectorized pass
+        buf = io.BytesIO()
+        copy_sql = cursor.mogrify(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", params)
+        cursor.copy_expert(copy_sql.decode(), buf)
 
         cursor.close()
-        conn.close()
-
-        return {
-            "success": True,
-            "data": data,
-            "totalRecords": len(data)
-        }
-
     except psycopg2.Error as e:
-        if conn:
-            conn.close()
         raise HTTPException(status_code=500, detail=f"Database query error: {str(e)}") from e
+    finally:
+        release_db_connection(conn)
+
+    # A fixed schema rather than inference from the first rows: whole-valued floats would otherwise
+    # type a column as integer, and a leading run of NULLs as string
+    df = pl.read_csv(buf.getvalue(), schema=ANALYTICS_DATA_SCHEMA)
+    body = (b'{"success":true,"data":' + df.write_json().encode()
+            + b',"totalRecords":' + str(df.height).encode() + b'}')
+    return Response(body, media_type="application/json")
 
 @app.post("/api/test-analysis")
 def test_analysis():
@@ -462,6 +1108,41 @@ def test_analysis():
     except (ImportError, AttributeError) as e:
         return {"status": "error", "message": str(e)}
 
+# Raw input columns for the capped analysis, in SELECT order
+CAPPED_INPUT_SCHEMA = {
+    'ProcessingDateKey': pl.Int64,
+    'CommitmentAmt': pl.Float64,
+    'OutstandingAmt': pl.Float64,
+    'BankID': pl.Utf8,
+    'LineofBusinessId': pl.Utf8,
+    'CommitmentSizeGroup': pl.Utf8,
+    'RiskGroupDesc': pl.Utf8,
+    'Region': pl.Utf8,
+    'NAICSGrpName': pl.Utf8,
+}
+_CAPPED_INPUT_COLUMNS = [
+    f'"{name}"::float8' if dtype == pl.Float64 else f'"{name}"'
+    for name, dtype in CAPPED_INPUT_SCHEMA.items()
+]
+
+def _copy_capped_input(conn, filters: FilterRequest, legacy: bool) -> bytes:
+    """Filtered capped-analysis input as CSV, COPYed out so no Python row objects are built"""
+    where_conditions, params = _build_where_conditions_from_filters(filters, legacy)
+
+    base_query = f'''
+    SELECT {', '.join(_CAPPED_INPUT_COLUMNS)}
+    FROM cla_uat.mv_t_cla_input_full_upd
+    '''
+    if where_conditions:
+        base_query += f" WHERE {' AND '.join(where_conditions)}"
+
+    buf = io.BytesIO()
+    with conn.cursor() as cursor:
+        copy_sql = cursor.mogrify(f"COPY ({base_query}) TO STDOUT WITH (FORMAT csv, HEADER true)", params)
+        cursor.copy_expert(copy_sql.decode(), buf)
+    return buf.getvalue()
+
+
 @app.post("/api/execute-capped-analysis")
 def execute_capped_analysis(request: QueryRequest):
     """Execute the testCappedvsUncapped analysis with filtered data"""
@@ -475,74 +1156,35 @@ def execute_capped_analysis(request: QueryRequest):
         from main import testCappedvsUncapped, setup_groups as setup_groups, BusinessConfig
         # analysis functions imported
 
+        # Same filters and thresholds give the same result until a NOTIFY clears the cache
+        cache_entry = (
+            hashlib.blake2b(request.filters.model_dump_json().encode(), digest_size=16).digest(),
+            BusinessConfig.MAX_MOM, BusinessConfig.MIN_MOM, BusinessConfig.MAX_MOM_HIGH,
+            BusinessConfig.MIN_MOM_HIGH, BusinessConfig.HIGH_BREACH_PERC,
+        )
+        cached = get_cached_response('capped_analysis', cache_entry)
+        if cached is not _MISSING:
+            return Response(cached, media_type="application/json")
+
         conn = get_db_connection()
         if not conn:
             raise HTTPException(status_code=500, detail="Database connection failed")
 
-        # Build WHERE conditions based on filters
-        where_conditions, params = _build_where_conditions_from_filters(request.filters)
-
-        # Build the query to get raw data for analysis
-        base_query = '''
-        SELECT 
-            "ProcessingDateKey",
-            "CommitmentAmt",
-            "OutstandingAmt",
-            "BankID",
-            "LineofBusinessId",
-            "CommitmentSizeGroup", 
-            "RiskGroupDesc",
-            "Region",
-            "NAICSGrpName"
-        FROM cla_uat.mv_t_cla_input_full_upd
-        '''
-
-        if where_conditions:
-            base_query += f" WHERE {' AND '.join(where_conditions)}"
-
-        # Execute query and get raw data
-        cursor = conn.cursor()
-        cursor.execute(base_query, params)
-        columns = [desc[0] for desc in cursor.description]
-        results = cursor.fetchall()
-
-        # Convert to DataFrame with proper column names
-        df_data = []
-        column_mapping = {
-            'ProcessingDateKey': 'ProcessingDateKey',
-            'CommitmentAmt': 'CommitmentAmt',
-            'OutstandingAmt': 'OutstandingAmt',
-            'BankID': 'BankID'
-        }
-
-        for row in results:
-            row_dict = {}
-            for i, value in enumerate(row):
-                col_name = columns[i]
-                mapped_name = column_mapping.get(col_name, columns[i])
-                if hasattr(value, 'quantize'):  # Decimal type
-                    row_dict[mapped_name] = float(value) if value is not None else None
-                else:
-                    row_dict[mapped_name] = value
-            df_data.append(row_dict)
+        csv_data = _with_schema_fallback(lambda legacy: _copy_capped_input(conn, request.filters, legacy))
 
-        cursor.close()
-        conn.close()
+        release_db_connection(conn)
         conn = None
 
-        if not df_data:
+        # The fixed schema skips type inference
+        df_polars = pl.read_csv(csv_data, schema=CAPPED_INPUT_SCHEMA)
+
+        if df_polars.is_empty():
             return {
                 "success": False,
                 "error": "No data found for the selected filters",
                 "data": []
             }
 
-        # Convert to DataFrame for processing
-        df = pd.DataFrame(df_data)
-
-        # Run the setup_groups analysis to get capped differences
-        df_polars = pl.from_pandas(df)
-
         # Get the capped analysis results
         ca_pivot, oa_pivot, deals_pivot = setup_groups(
             df_polars,
@@ -574,131 +1216,159 @@ def execute_capped_analysis(request: QueryRequest):
             None  # Don't save to file
         )
 
-        # Convert result to JSON format
-        if hasattr(result_df, 'to_dicts'):
-            analysis_results = result_df.to_dicts()
-        else:
-            analysis_results = result_df.to_dict('records')
-
-        # Format ProcessingDateKey as YYYYMMDD string and handle NaN values
-        formatted_results = []
-        for record in analysis_results:
-            formatted_record = {}
-            for key, value in record.items():
-                # Handle NaN values
-                if value is not None and hasattr(value, '__class__') and 'float' in str(value.__class__):
-                    import math
-                    if math.isnan(value) or math.isinf(value):
-                        value = None
-
-                formatted_record[key] = value
-
-            # Format dates as YYYYMMDD strings
-            if 'ProcessingDateKey' in formatted_record and formatted_record['ProcessingDateKey']:
-                date_int = int(formatted_record['ProcessingDateKey'])
-                formatted_record['ProcessingDateKey'] = str(date_int)
-            if 'ProcessingDateKeyPrior' in formatted_record and formatted_record['ProcessingDateKeyPrior']:
-                date_int = int(formatted_record['ProcessingDateKeyPrior'])
-                formatted_record['ProcessingDateKeyPrior'] = str(date_int) if date_int != 0 else '0'
-
-            formatted_results.append(formatted_record)
+        if not isinstance(result_df, pl.DataFrame):
+            result_df = pl.from_pandas(result_df)
 
-        return {
-            "success": True,
-            "data": formatted_results,
-            "totalRecords": len(formatted_results),
-            "analysis_type": "capped_vs_uncapped",
-            "filters_applied": request.filters.model_dump()
-        }
+        # Null out NaN/inf and render the date keys as YYYYMMDD strings, then let polars
+        # serialize the rows directly instead of walking every record in Python
+        date_keys = [c for c in ('ProcessingDateKey', 'ProcessingDateKeyPrior') if c in result_df.columns]
+        float_cols = [c for c, dtype in result_df.schema.items() if dtype.is_float() and c not in date_keys]
+        result_df = result_df.with_columns(
+            *(pl.col(c).cast(pl.Int64).cast(pl.Utf8) for c in date_keys),
+            *(pl.when(pl.col(c).is_finite()).then(pl.col(c)).alias(c) for c in float_cols),
+        )
+
+        body = (b'{"success":true,"data":' + result_df.write_json().encode()
+                + b',"totalRecords":' + str(result_df.height).encode()
+                + b',"analysis_type":"capped_vs_uncapped","filters_applied":'
+                + orjson.dumps(request.filters.model_dump()) + b'}')
+        set_cached_response('capped_analysis', body, cache_entry)
+        return Response(body, media_type="application/json")
 
     except Exception as e:
         # log error
         if conn:
-            conn.close()
+            release_db_connection(conn)
         raise HTTPException(status_code=500, detail=f"Analysis error: {str(e)}") from e
 
-@app.get("/api/summary-stats")
-def get_summary_stats():
-    """Get summary statistics from the database"""
-    conn = get_db_connection()
-    if not conn:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-
-    try:
-        cursor = conn.cursor()
+# COUNT(DISTINCT) can't use parallel workers and sorts per column; each distinct count is a
+# GROUP BY in its own CTE instead, which the planner can hash-aggregate in parallel
+_DISTINCT_COUNT_CTE = '''
+    {name} AS (
+        SELECT COUNT(*) AS n FROM (
+            SELECT {column} FROM cla_uat.mv_t_cla_input_full_upd
+            WHERE "CommitmentAmt" IS NOT NULL AND {column} IS NOT NULL
+            GROUP BY {column}
+        ) g
+    )'''
+
+SUMMARY_STATS_QUERY = '''
+    WITH totals AS (
+        SELECT 
+            COUNT(*) as total_records,
+            MIN("ProcessingDateKey") as earliest_date,
+            MAX("ProcessingDateKey") as latest_date,
+            SUM("CommitmentAmt")::float8 as total_commitment,
+            AVG("CommitmentAmt")::float8 as avg_commitment
+        FROM cla_uat.mv_t_cla_input_full_upd
+        WHERE "CommitmentAmt" IS NOT NULL
+    ),''' + ','.join(
+    _DISTINCT_COUNT_CTE.format(name=name, column=column)
+    for name, column in (
+        ('months', '"ProcessingDateKey"'),
+        ('regions', '"Region"'),
+        ('lobs', '"LineofBusinessId"'),
+        ('banks', '"BankID"'),
+    )
+) + ''',
+    maxd AS (
+        -- Index-only on idx_mv_processing_date; the latest-month scan then reads just that key's range
+        SELECT MAX("ProcessingDateKey") AS md FROM cla_uat.mv_t_cla_input_full_upd
+    ),
+    latest AS (
+        SELECT 
+            f."ProcessingDateKey",
+            COUNT(*) as deals,
+            SUM(f."CommitmentAmt")::float8 as total_commitment,
+            SUM(f."OutstandingAmt")::float8 AS total_outstanding
+        FROM cla_uat.mv_t_cla_input_full_upd f JOIN maxd ON f."ProcessingDateKey" = maxd.md
+        GROUP BY f."ProcessingDateKey"
+    )
+    SELECT 
+        t.total_records,
+        months.n as unique_months,
+        t.earliest_date,
+        t.latest_date,
+        t.total_commitment,
+        t.avg_commitment,
+        regions.n as unique_regions,
+        lobs.n as unique_lobs,
+        banks.n as unique_banks,
+        l."ProcessingDateKey" as latest_month,
+        l.deals as latest_deals,
+        l.total_commitment as latest_commitment,
+        l.total_outstanding as latest_outstanding
+    FROM totals t CROSS JOIN months CROSS JOIN regions CROSS JOIN lobs CROSS JOIN banks
+    LEFT JOIN latest l ON true
+'''
+
+# The same row, precomputed by mock_db_setup.sql and refreshed with filter_options_mv
+SUMMARY_STATS_MV_QUERY = '''
+    SELECT total_records, unique_months, earliest_date, latest_date, total_commitment, avg_commitment,
+           unique_regions, unique_lobs, unique_banks,
+           latest_month, latest_deals, latest_commitment, latest_outstanding
+    FROM cla_uat.summary_stats_mv
+    LIMIT 1
+'''
 
-        stats_query = '''
-            SELECT 
-                COUNT(*) as total_records,
-                COUNT(DISTINCT "ProcessingDateKey") as unique_months,
-                MIN("ProcessingDateKey") as earliest_date,
-                MAX("ProcessingDateKey") as latest_date,
-                SUM("CommitmentAmt") as total_commitment,
-                AVG("CommitmentAmt") as avg_commitment,
-                COUNT(DISTINCT "Region") as unique_regions,
-                COUNT(DISTINCT "LineofBusinessId") as unique_lobs,
-                COUNT(DISTINCT "BankID") as unique_banks
-            FROM cla_uat.mv_t_cla_input_full_upd
-            WHERE "CommitmentAmt" IS NOT NULL
-        '''
 
-        cursor.execute(stats_query)
-        stats_row = cursor.fetchone()
-
-        last_month_query = '''
-            SELECT 
-                "ProcessingDateKey",
-                COUNT(*) as deals,
-                SUM("CommitmentAmt") as total_commitment,
-                SUM("OutstandingAmt")::float8 AS total_outstanding
-            FROM cla_uat.mv_t_cla_input_full_upd
-            WHERE "ProcessingDateKey" = (SELECT MAX("ProcessingDateKey") FROM cla_uat.mv_t_cla_input_full_upd)
-            GROUP BY "ProcessingDateKey"
-        '''
+@app.get("/api/summary-stats")
+async def get_summary_stats(if_none_match: Optional[str] = Header(None)):
+    """Get summary statistics from the database"""
+    cached = get_cached_response('summary_stats')
+    if cached is not _MISSING:
+        return etag_response(cached, if_none_match)
 
-        cursor.execute(last_month_query)
-        latest_row = cursor.fetchone()
+    async with _CACHE_FILL_LOCKS['summary_stats']:
+        # Another request may have filled it while this one waited
+        cached = get_cached_response('summary_stats')
+        if cached is not _MISSING:
+            return etag_response(cached, if_none_match)
 
-        cursor.close()
-        conn.close()
-
-        summary_payload = {
-            "totalRecords": int(stats_row[0]) if stats_row and stats_row[0] is not None else 0,
-            "uniqueMonths": int(stats_row[1]) if stats_row and stats_row[1] is not None else 0,
-            "dateRange": {
-                "earliest": str(stats_row[2]) if stats_row and stats_row[2] is not None else None,
-                "latest": str(stats_row[3]) if stats_row and stats_row[3] is not None else None,
-            },
-            "totals": {
-                "commitment": float(stats_row[4]) if stats_row and stats_row[4] is not None else 0.0,
-                "averageCommitment": float(stats_row[5]) if stats_row and stats_row[5] is not None else 0.0,
-            },
-            "uniqueCounts": {
-                "regions": int(stats_row[6]) if stats_row and stats_row[6] is not None else 0,
-                "lineOfBusiness": int(stats_row[7]) if stats_row and stats_row[7] is not None else 0,
-                "banks": int(stats_row[8]) if stats_row and stats_row[8] is not None else 0,
-            },
-        }
+        try:
+            try:
+                row = await asyncio.to_thread(_fetch_row, SUMMARY_STATS_MV_QUERY)
+            except psycopg2.errors.UndefinedTable:
+                # No summary_stats_mv yet: aggregate live, still in one statement and one round trip
+                row = await asyncio.to_thread(_fetch_row, SUMMARY_STATS_QUERY)
+            stats_row, latest_row = (row[:9], row[9:]) if row else (None, None)
+
+            summary_payload = {
+                "totalRecords": int(stats_row[0]) if stats_row and stats_row[0] is not None else 0,
+                "uniqueMonths": int(stats_row[1]) if stats_row and stats_row[1] is not None else 0,
+                "dateRange": {
+                    "earliest": str(stats_row[2]) if stats_row and stats_row[2] is not None else None,
+                    "latest": str(stats_row[3]) if stats_row and stats_row[3] is not None else None,
+                },
+                "totals": {
+                    "commitment": float(stats_row[4]) if stats_row and stats_row[4] is not None else 0.0,
+                    "averageCommitment": float(stats_row[5]) if stats_row and stats_row[5] is not None else 0.0,
+                },
+                "uniqueCounts": {
+                    "regions": int(stats_row[6]) if stats_row and stats_row[6] is not None else 0,
+                    "lineOfBusiness": int(stats_row[7]) if stats_row and stats_row[7] is not None else 0,
+                    "banks": int(stats_row[8]) if stats_row and stats_row[8] is not None else 0,
+                },
+            }
 
-        latest_payload = {
-            "date": str(latest_row[0]) if latest_row and latest_row[0] is not None else None,
-            "deals": int(latest_row[1]) if latest_row and latest_row[1] is not None else 0,
-            "totalCommitment": float(latest_row[2]) if latest_row and latest_row[2] is not None else 0.0,
-            "totalOutstanding": float(latest_row[3]) if latest_row and latest_row[3] is not None else 0.0,
-        }
+            latest_payload = {
+                "date": str(latest_row[0]) if latest_row and latest_row[0] is not None else None,
+                "deals": int(latest_row[1]) if latest_row and latest_row[1] is not None else 0,
+                "totalCommitment": float(latest_row[2]) if latest_row and latest_row[2] is not None else 0.0,
+                "totalOutstanding": float(latest_row[3]) if latest_row and latest_row[3] is not None else 0.0,
+            }
 
-        return {
-            "success": True,
-            "data": {
-                "summary": summary_payload,
-                "latestMonth": latest_payload,
-            },
-        }
+            response = {
+                "success": True,
+                "data": {
+                    "summary": summary_payload,
+                    "latestMonth": latest_payload,
+                },
+            }
+            return etag_response(cache_encoded_response('summary_stats', response), if_none_match)
 
-    except psycopg2.Error as e:
-        if conn:
-            conn.close()
-        raise HTTPException(status_code=500, detail=f"Database query error: {str(e)}") from e
+        except psycopg2.Error as e:
+            raise HTTPException(status_code=500, detail=f"Database query error: {str(e)}") from e
 
 if __name__ == "__main__":
     import uvicorn
@@ -707,9 +1377,24 @@ if __name__ == "__main__":
     print(f"📊 Database: {DB_CONFIG['database']} @ {DB_CONFIG['host']}:{DB_CONFIG['port']}")
     print("🌐 Frontend CORS enabled for: http://localhost:3000, http://localhost:5173")
     
+    # API_RELOAD=1 keeps the single auto-reloading process for development
+    reload = os.getenv('API_RELOAD', '').lower() in ('1', 'true', 'yes')
+    workers = 1 if reload else int(os.getenv('API_WORKERS', str(os.cpu_count() or 1)))
+    max_workers = max(1, DB_CONNECTION_BUDGET // (MIN_WORKER_POOL + _DEDICATED_CONNECTIONS))
+    if workers > max_workers:
+        print(f"⚠️  Clamping workers from {workers} to {max_workers} to stay within DB_POOL_MAX={DB_CONNECTION_BUDGET}")
+        workers = max_workers
+    os.environ['API_WORKERS'] = str(workers)  # read by each worker to size its share of the pool
+    # Past this many in-flight requests per worker uvicorn answers 503 instead of queueing without bound
+    limit_concurrency = int(os.getenv('API_LIMIT_CONCURRENCY', '0')) or None
+
     uvicorn.run(
         "backend_api:app",
         host="0.0.0.0",
         port=int(os.getenv('API_PORT', '8000')),
-        reload=True
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        limit_concurrency=limit_concurrency,
+        reload=reload
     )
\ No newline at end of file
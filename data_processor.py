@@ -1,7 +1,8 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
-import json
+import os
+import orjson
 from typing import Dict, List, Any
 
 
@@ -146,6 +147,18 @@ def filter_data(df_records: List[Dict], filters: Dict[str, Any]) -> List[Dict]:
     return df.to_dict('records')
 
 
+def save_processed_data(result: Dict[str, Any], file_path: str = "processed_data.json") -> None:
+    """
+    Write processed data with orjson; pretty-printed only when DEBUG is set
+    """
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    if os.getenv('DEBUG', '').lower() in ('1', 'true', 'yes'):
+        option |= orjson.OPT_INDENT_2
+    with open(file_path, 'wb') as f:
+        # default=str only catches values orjson has no native encoding for
+        f.write(orjson.dumps(result, option=option, default=str))
+
+
 if __name__ == "__main__":
     # Test the data processing
     result = load_and_process_csv()
@@ -156,7 +169,6 @@ if __name__ == "__main__":
     print(f"Summary: {result['summary']}")
 
     # Save processed data for API to use
-    with open('processed_data.json', 'w') as f:
-        json.dump(result, f, indent=2, default=str)
+    save_processed_data(result)
 
     print("\nSaved processed data to processed_data.json")
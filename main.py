@@ -1,5 +1,6 @@
 import polars as pl
 import pandas as pd
+import logging
 import os
 import socket
 from importlib import import_module
@@ -9,14 +10,18 @@ try:
 except ModuleNotFoundError:
     def load_dotenv() -> None:
         return None
+import threading
 import time
-from typing import Optional, Union, Dict, Any, List
+from contextlib import contextmanager
+from typing import Optional, Union, Dict, Any, Iterator, List
 import numpy as np
 from urllib.parse import quote_plus
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class BusinessConfig:
     """Configuration class for business logic constants."""
@@ -69,36 +74,113 @@ def test_network_connectivity() -> bool:
         return False
 
 
-def get_db_connection() -> Optional[Any]:
-    """Create and return a database connection with optimized settings."""
+_DB_POOL = None
+_DB_POOL_LOCK = threading.Lock()
+
+
+def get_db_pool() -> Optional[Any]:
+    """Return the process-wide psycopg2 connection pool, creating it on first use."""
+    global _DB_POOL
+    if _DB_POOL is not None:
+        return _DB_POOL
     if not validate_env_variables():
         return None
 
+    # Import locally to avoid hard dependency at module import time
     try:
-        # Import locally to avoid hard dependency at module import time
-        try:
-            psycopg2_mod = import_module("psycopg2")  # type: ignore[attr-defined]
-        except ModuleNotFoundError:
-            print("psycopg2 is not installed. Install it to enable DB connections.")
-            return None
-        conn = psycopg2_mod.connect(
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            host=os.getenv('DB_HOST'),
-            port=int(os.getenv('DB_PORT')),
-            database=os.getenv('DB_NAME'),
-            sslmode='require',
-            keepalives=1,
-            keepalives_idle=30,
-            keepalives_interval=10,
-            keepalives_count=5,
-            application_name='large_data_transfer'
-        )
-        conn.set_session(readonly=True)
-        return conn
-    except RuntimeError as e:
+        pool_mod = import_module("psycopg2.pool")  # type: ignore[attr-defined]
+    except ModuleNotFoundError:
+        print("psycopg2 is not installed. Install it to enable DB connections.")
+        return None
+
+    with _DB_POOL_LOCK:
+        if _DB_POOL is None:
+            _DB_POOL = pool_mod.ThreadedConnectionPool(
+                minconn=int(os.getenv('DB_POOL_MIN', '4')),
+                maxconn=int(os.getenv('DB_POOL_MAX', '20')),
+                user=os.getenv('DB_USER'),
+                password=os.getenv('DB_PASSWORD'),
+                host=os.getenv('DB_HOST'),
+                port=int(os.getenv('DB_PORT')),
+                database=os.getenv('DB_NAME'),
+                sslmode='require',
+                keepalives=1,
+                keepalives_idle=30,
+                keepalives_interval=10,
+                keepalives_count=5,
+                application_name='large_data_transfer'
+            )
+    return _DB_POOL
+
+
+# getconn() raises PoolError the moment every connection is out; callers wait on one of these
+# slots instead (up to DB_ACQUIRE_TIMEOUT seconds), one slot per pooled connection
+_DB_SLOTS = threading.BoundedSemaphore(int(os.getenv('DB_POOL_MAX', '20')))
+DB_ACQUIRE_TIMEOUT = float(os.getenv('DB_ACQUIRE_TIMEOUT', '30'))
+_SLOT_HOLDERS: set = set()
+
+
+def get_db_connection() -> Optional[Any]:
+    """Borrow a read-only connection from the pool; hand it back with release_db_connection().
+
+    Waits up to DB_ACQUIRE_TIMEOUT for a connection when the pool is busy, then returns None.
+    """
+    try:
+        pool = get_db_pool()
+    except Exception as e:
         print(f"Connection error: {e}")
         return None
+    if pool is None:
+        return None
+    if not _DB_SLOTS.acquire(timeout=DB_ACQUIRE_TIMEOUT):
+        print(f"Connection pool exhausted: no connection freed up within {DB_ACQUIRE_TIMEOUT:g}s")
+        return None
+    try:
+        conn = pool.getconn()
+        if not conn.readonly:
+            conn.set_session(readonly=True)
+    except Exception as e:
+        _DB_SLOTS.release()
+        if isinstance(e, import_module("psycopg2.pool").PoolError):
+            print(f"Connection pool error: {e}")
+        else:
+            print(f"Connection error: {e}")
+        return None
+    _SLOT_HOLDERS.add(id(conn))
+    return conn
+
+
+def release_db_connection(conn: Optional[Any]) -> None:
+    """Return a connection to the pool, discarding it if it has been closed."""
+    if conn is None or _DB_POOL is None:
+        return
+    try:
+        _DB_POOL.putconn(conn, close=bool(conn.closed))
+    except Exception as e:
+        print(f"Error releasing connection: {e}")
+    finally:
+        if id(conn) in _SLOT_HOLDERS:
+            _SLOT_HOLDERS.discard(id(conn))
+            _DB_SLOTS.release()
+
+
+@contextmanager
+def db_connection() -> Iterator[Optional[Any]]:
+    """Context manager around get_db_connection/release_db_connection; yields None if unavailable."""
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        release_db_connection(conn)
+
+
+def close_db_pool() -> None:
+    """Close every pooled connection, e.g. on application shutdown."""
+    global _DB_POOL
+    with _DB_POOL_LOCK:
+        if _DB_POOL is not None:
+            _DB_POOL.closeall()
+            _DB_POOL = None
 
 
 def get_db_connection_uri() -> Optional[str]:
@@ -125,7 +207,6 @@ def get_db_connection_uri() -> Optional[str]:
             password = password[1:-1]
 
         # URL encode the password to handle special characters
-        from urllib.parse import quote_plus
         encoded_password = quote_plus(password)
 
         # Construct the PostgreSQL URI
@@ -151,15 +232,16 @@ def test_db_connection() -> Dict[str, Any]:
             }
 
         # Get the database version
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT version()")
-            version = cursor.fetchone()[0]
-
-            # Get the max processing date
-            cursor.execute('SELECT MAX(processingdatekey) FROM analytics_data')
-            max_date = cursor.fetchone()[0]
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT version()")
+                version = cursor.fetchone()[0]
 
-        conn.close()
+                # Get the max processing date
+                cursor.execute('SELECT MAX(processingdatekey) FROM analytics_data')
+                max_date = cursor.fetchone()[0]
+        finally:
+            release_db_connection(conn)
 
         return {
             "status": "connected",
@@ -234,12 +316,14 @@ def get_max_processing_date() -> Optional[str]:
         if not conn:
             return None
 
-        with conn.cursor() as cursor:
-            # Get the maximum ProcessingDateKey from analytics_data table
-            cursor.execute('SELECT MAX(processingdatekey) FROM analytics_data')
-            max_date = cursor.fetchone()[0]
+        try:
+            with conn.cursor() as cursor:
+                # Get the maximum ProcessingDateKey from analytics_data table
+                cursor.execute('SELECT MAX(processingdatekey) FROM analytics_data')
+                max_date = cursor.fetchone()[0]
+        finally:
+            release_db_connection(conn)
 
-        conn.close()
         return max_date
     except Exception as e:
         print(f"Error getting max processing date: {e}")
@@ -289,7 +373,10 @@ def get_available_line_of_business_ids(use_polars: bool = True) -> List[Dict[str
             conn = get_db_connection()
             if conn is None:
                 return []
-            df = pd.read_sql_query(query, conn)
+            try:
+                df = pd.read_sql_query(query, conn)
+            finally:
+                release_db_connection(conn)
             lob_options = []
             for _, row in df.iterrows():
                 lob_id = row['LineofBusinessId']
@@ -301,8 +388,6 @@ def get_available_line_of_business_ids(use_polars: bool = True) -> List[Dict[str
                     'display_name': f"LOB {lob_id}{sba_indicator}",
                     'record_count': count
                 })
-            # Close the connection
-            conn.close()
 
         print(f"Found {len(lob_options)} Line of Business IDs:")
         for lob_item in lob_options:
@@ -344,10 +429,11 @@ def get_available_commitment_size_groups(use_polars: bool = True) -> List[str]:
             conn = get_db_connection()
             if conn is None:
                 return []
-            df = pd.read_sql_query(query, conn)
+            try:
+                df = pd.read_sql_query(query, conn)
+            finally:
+                release_db_connection(conn)
             size_groups = df['CommitmentSizeGroup'].tolist()
-            # Close the connection
-            conn.close()
 
         # Filter out any None or empty values that might have slipped through
         size_groups = [sg for sg in size_groups if sg and sg.strip() and sg != 'NULL']
@@ -389,10 +475,11 @@ def get_available_risk_group_descriptions(use_polars: bool = True) -> List[str]:
             conn = get_db_connection()
             if conn is None:
                 return []
-            df = pd.read_sql_query(query, conn)
+            try:
+                df = pd.read_sql_query(query, conn)
+            finally:
+                release_db_connection(conn)
             risk_groups = df['RiskGroupDesc'].tolist()
-            # Close the connection
-            conn.close()
 
         # Filter out any None or empty values that might have slipped through
         risk_groups = [rg for rg in risk_groups if rg and rg.strip() and rg != 'NULL']
@@ -458,10 +545,11 @@ def get_available_regions(use_polars: bool = True) -> List[str]:
             conn = get_db_connection()
             if conn is None:
                 return []
-            df = pd.read_sql_query(query, conn)
+            try:
+                df = pd.read_sql_query(query, conn)
+            finally:
+                release_db_connection(conn)
             regions = df['Region'].tolist()
-            # Close the connection
-            conn.close()
 
         # Filter out any None or empty values that might have slipped through
         regions = [r for r in regions if r and r.strip() and r != 'NULL']
@@ -474,6 +562,76 @@ def get_available_regions(use_polars: bool = True) -> List[str]:
         return []
 
 
+# SQL predicate for each SBA classification; 'All' applies none
+SBA_FILTER_CONDITIONS = {
+    'All': None,
+    'SBA': "lineofbusinessid = '12'",
+    'Non-SBA': "lineofbusinessid != '12'",
+}
+
+
+def _any_condition(column: str, name: str, values: Union[str, List[str]], params: Dict[str, Any]) -> str:
+    """Match one value or any of a list, bound as the text[] parameter `name`"""
+    params[name] = [str(v) for v in values] if isinstance(values, list) else [str(values)]
+    return f"{column} = ANY(%({name})s::text[])"
+
+
+def _build_where_conditions(
+        region: str,
+        sba_filter: str,
+        line_of_business_ids: Optional[Union[str, List[str]]] = None,
+        commitment_size_groups: Optional[Union[str, List[str]]] = None,
+        risk_group_descriptions: Optional[Union[str, List[str]]] = None
+) -> tuple[List[str], Dict[str, Any]]:
+    """Build every predicate for the analytics_data query so they can be ANDed into one WHERE clause,
+    along with the parameters they bind"""
+    # Lowercase column names for PostgreSQL compatibility
+    params: Dict[str, Any] = {"region": region}
+    where_conditions = ["region = %(region)s"]
+
+    # SBA filter is the primary classification filter
+    sba_condition = SBA_FILTER_CONDITIONS.get(sba_filter)
+    if sba_condition:
+        where_conditions.append(sba_condition)
+        logger.debug("Applying %s classification filter: %s", sba_filter, sba_condition)
+    else:
+        logger.debug("No SBA classification filter applied (All SBA classifications)")
+
+    # Specific Line of Business IDs are secondary and work within the SBA classification
+    if line_of_business_ids is not None:
+        where_conditions.append(_any_condition("lineofbusinessid", "line_of_business_ids", line_of_business_ids, params))
+        logger.debug("Applying specific Line of Business ID filter: %s", line_of_business_ids)
+    else:
+        logger.debug("No specific Line of Business ID filter applied")
+
+    if commitment_size_groups is not None:
+        where_conditions.append(_any_condition("commitmentsizegroup", "commitment_size_groups", commitment_size_groups, params))
+        logger.debug("Applying Commitment Size Group filter: %s", commitment_size_groups)
+
+    if risk_group_descriptions is not None:
+        where_conditions.append(_any_condition("riskgroupdesc", "risk_group_descriptions", risk_group_descriptions, params))
+        logger.debug("Applying Risk Group Description filter: %s", risk_group_descriptions)
+
+    # Exclude matured loans with low outstanding amounts
+    where_conditions.append(
+        "NOT (currentmaturitydatekey < processingdatekey AND NULLIF(outstandingamt::text, 'NULL')::float8 < 1000)"
+    )
+    return where_conditions, params
+
+
+def _read_filtered_polars(query: str, params: Dict[str, Any]) -> Optional[pl.DataFrame]:
+    """Run a parameterized query on a pooled connection; read_database_uri cannot bind parameters"""
+    with db_connection() as conn:
+        if conn is None:
+            return None
+        try:
+            return pl.read_database(query, connection=conn, execute_options={"parameters": params})
+        except Exception as e:
+            logger.debug("Polars read_database failed: %s", e)
+            conn.rollback()
+            return None
+
+
 def get_data_optimized(
         selected_columns: Optional[list] = None,
         use_polars: bool = True,
@@ -516,56 +674,12 @@ def get_data_optimized(
     else:
         columns_str = "*"
 
-    # Build WHERE conditions using lowercase column names
-    where_conditions = [
-        f"region = '{region}'"
-    ]
-
-    # Add SBA filter - this is the primary classification filter
-    if sba_filter == 'SBA':
-        where_conditions.append("lineofbusinessid = '12'")
-        print("Applying SBA classification filter: lineofbusinessid = '12'")
-    elif sba_filter == 'Non-SBA':
-        where_conditions.append("lineofbusinessid != '12'")
-        print("Applying Non-SBA classification filter: lineofbusinessid != '12'")
-    else:
-        print("No SBA classification filter applied (All SBA classifications)")
-
-    # Add specific Line of Business ID filter - this is secondary and works within the SBA classification
-    if line_of_business_ids is not None:
-        if isinstance(line_of_business_ids, list):
-            lob_list = [f"'{lob}'" for lob in line_of_business_ids]
-            where_conditions.append(f"lineofbusinessid IN ({', '.join(lob_list)})")
-            print("Applying specific Line of Business ID filter:", ", ".join(line_of_business_ids))
-        else:
-            where_conditions.append(f"lineofbusinessid = '{line_of_business_ids}'")
-            print("Applying specific Line of Business ID filter:", line_of_business_ids)
-    else:
-        print("No specific Line of Business ID filter applied")
-
-    # Add commitment size group filter
-    if commitment_size_groups is not None:
-        if isinstance(commitment_size_groups, list):
-            csg_list = [f"'{csg}'" for csg in commitment_size_groups]
-            where_conditions.append(f"commitmentsizegroup IN ({', '.join(csg_list)})")
-            print("Applying Commitment Size Group filter:", ", ".join(commitment_size_groups))
-        else:
-            where_conditions.append(f"commitmentsizegroup = '{commitment_size_groups}'")
-            print("Applying Commitment Size Group filter:", commitment_size_groups)
-
-    # Add risk group description filter
-    if risk_group_descriptions is not None:
-        if isinstance(risk_group_descriptions, list):
-            rgd_list = [f"'{rgd}'" for rgd in risk_group_descriptions]
-            where_conditions.append(f"riskgroupdesc IN ({', '.join(rgd_list)})")
-            print("Applying Risk Group Description filter:", ", ".join(risk_group_descriptions))
-        else:
-            where_conditions.append(f"riskgroupdesc = '{risk_group_descriptions}'")
-            print("Applying Risk Group Description filter:", risk_group_descriptions)
-
-    # Add maturity filter to exclude matured loans with low outstanding amounts
-    where_conditions.append(
-        "NOT (currentmaturitydatekey < processingdatekey AND NULLIF(outstandingamt::text, 'NULL')::float8 < 1000)"
+    where_conditions, params = _build_where_conditions(
+        region=region,
+        sba_filter=sba_filter,
+        line_of_business_ids=line_of_business_ids,
+        commitment_size_groups=commitment_size_groups,
+        risk_group_descriptions=risk_group_descriptions,
     )
 
     # Build the complete query
@@ -577,7 +691,8 @@ def get_data_optimized(
 
     # Add LIMIT clause if row_limit is specified
     if row_limit is not None:
-        query += f"\nLIMIT {row_limit}"
+        query += "\nLIMIT %(row_limit)s"
+        params["row_limit"] = row_limit
         print(f"Applying row limit: {row_limit}")
 
     print("\nApplied Filters Summary:")
@@ -599,7 +714,7 @@ def get_data_optimized(
 
         if use_polars:
             print("Using Polars for data processing...")
-            df = read_sql_polars(query)
+            df = _read_filtered_polars(query, params)
             if df is None:
                 return None
         else:
@@ -610,14 +725,11 @@ def get_data_optimized(
             try:
                 # Use chunksize for pandas to process in batches
                 chunks = []
-                for chunk in pd.read_sql_query(query, conn, chunksize=100000):
+                for chunk in pd.read_sql_query(query, conn, params=params, chunksize=100000):
                     chunks.append(chunk)
                 df = pd.concat(chunks) if chunks else pd.DataFrame()
             finally:
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+                release_db_connection(conn)
 
         query_time = time.time() - query_start
         print("✓ Database query and transfer completed in", f"{query_time:.2f}", "seconds")
@@ -674,6 +786,36 @@ def get_data_optimized(
         return None
 
 
+def get_data_lazy(
+        selected_columns: Optional[list] = None,
+        row_limit: Optional[int] = None,
+        region: str = 'Rocky Mountain',
+        sba_filter: str = 'Non-SBA',
+        line_of_business_ids: Optional[Union[str, List[str]]] = None,
+        commitment_size_groups: Optional[Union[str, List[str]]] = None,
+        risk_group_descriptions: Optional[Union[str, List[str]]] = None
+) -> Optional[pl.LazyFrame]:
+    """
+    Same filtered query as get_data_optimized, returned as a LazyFrame so callers
+    can chain cleaning, grouping and capping into a single collect().
+
+    Returns:
+    LazyFrame over the filtered data, or None if the query failed or returned no rows
+    """
+    df = get_data_optimized(
+        selected_columns=selected_columns,
+        use_polars=True,
+        show_timing=False,
+        row_limit=row_limit,
+        region=region,
+        sba_filter=sba_filter,
+        line_of_business_ids=line_of_business_ids,
+        commitment_size_groups=commitment_size_groups,
+        risk_group_descriptions=risk_group_descriptions,
+    )
+    return df.lazy() if df is not None else None
+
+
 def aggregate_composites(bank_pivot_df: pl.DataFrame, bankid_mod_list: List[str],
                          bankid_inc_list: List[str]) -> List[float]:
     """Calculate aggregated composites using vectorized Polars operations.
@@ -825,8 +967,8 @@ def get_capped_diff_pivoted_revs(group_df: pl.LazyFrame, amt_field: str, max_mom
     return cla_pivot_df
 
 
-def cap_max_proportion(group_df: pl.DataFrame, amt_field: str,
-                       lim_perc: float = BusinessConfig.MAX_BANK_CELL_WEIGHT) -> pl.DataFrame:
+def cap_max_proportion(group_df: Union[pl.DataFrame, pl.LazyFrame], amt_field: str,
+                       lim_perc: float = BusinessConfig.MAX_BANK_CELL_WEIGHT) -> Union[pl.DataFrame, pl.LazyFrame]:
     """Cap the maximum percentage of any bank in any period to a given value."""
 
     # Calculate sum per period
@@ -866,45 +1008,39 @@ def cap_max_proportion(group_df: pl.DataFrame, amt_field: str,
     return result_df
 
 
-def setup_groups(cla_input_df: pl.DataFrame, max_mom: float = BusinessConfig.MAX_MOM,
+def setup_groups(cla_input_df: Union[pl.DataFrame, pl.LazyFrame], max_mom: float = BusinessConfig.MAX_MOM,
                  min_mom: float = BusinessConfig.MIN_MOM, max_mom_high: float = BusinessConfig.MAX_MOM_HIGH,
                  min_mom_high: float = BusinessConfig.MIN_MOM_HIGH,
                  high_breach_perc: float = BusinessConfig.HIGH_BREACH_PERC) -> tuple:
-    """Set up groups with capping and pivoting logic - complete pandas equivalent."""
+    """Set up groups with capping and pivoting logic - complete pandas equivalent.
 
-    # Check if it's a LazyFrame and collect if needed, otherwise use as is
-    if hasattr(cla_input_df, 'collect'):
-        cla_input_df = cla_input_df.collect()
+    Cleaning, grouping and proportion capping run as one lazy plan; it is collected
+    once before the per-field pivots rather than once per pivot.
+    """
+
+    cla_input_lf = cla_input_df.lazy()
+    schema = cla_input_lf.collect_schema()
 
     # First check what types we're dealing with and handle accordingly
-    print("Initial column types:", cla_input_df.dtypes)
+    print("Initial column types:", schema.dtypes())
 
     # Handle NULL strings by converting to proper nulls, being type-aware
     def safe_null_replacement(col_name: str):
-        col_dtype = cla_input_df.select(pl.col(col_name)).dtypes[0]
-        if col_dtype == pl.Utf8:  # If it's a string column
+        if schema[col_name] == pl.Utf8:  # If it's a string column
             return pl.when(pl.col(col_name) == "NULL").then(None).otherwise(pl.col(col_name))
         else:  # If it's already numeric
             return pl.col(col_name)
 
-    # Apply safe null replacement and convert to numeric
-    cla_input_df = cla_input_df.with_columns([
-        safe_null_replacement('CommitmentAmt').cast(pl.Float64, strict=False).alias('CommitmentAmt'),
-        safe_null_replacement('OutstandingAmt').cast(pl.Float64, strict=False).alias('OutstandingAmt'),
+    # Apply safe null replacement and convert to numeric, filling resulting nulls with zeros
+    cla_input_lf = cla_input_lf.with_columns([
+        safe_null_replacement('CommitmentAmt').cast(pl.Float64, strict=False).fill_null(0.0).alias('CommitmentAmt'),
+        safe_null_replacement('OutstandingAmt').cast(pl.Float64, strict=False).fill_null(0.0).alias('OutstandingAmt'),
         pl.col('ProcessingDateKey').cast(pl.Int64, strict=False),
         pl.col('BankID').cast(pl.Utf8)  # Keep BankID as string
     ])
 
-    # Fill any resulting nulls with zeros
-    cla_input_df = cla_input_df.with_columns([
-        pl.col('CommitmentAmt').fill_null(0.0),
-        pl.col('OutstandingAmt').fill_null(0.0)
-    ])
-
-    print("After cleaning column types:", cla_input_df.dtypes)
-
     # Group by ProcessingDateKey and BankID and aggregate
-    cla_group_df = (cla_input_df
+    cla_group_lf = (cla_input_lf
     .group_by(['ProcessingDateKey', 'BankID'])
     .agg([
         pl.col('CommitmentAmt').sum().alias('CommitmentAmt'),
@@ -913,10 +1049,11 @@ def setup_groups(cla_input_df: pl.DataFrame, max_mom: float = BusinessConfig.MAX
     ]))
 
     # Apply proportion capping for each amount field
-    cla_group_df = cap_max_proportion(cla_group_df, 'CommitmentAmt')
-    cla_group_df = cap_max_proportion(cla_group_df, 'OutstandingAmt')
-    cla_group_df = cap_max_proportion(cla_group_df, 'Deals')
+    cla_group_lf = cap_max_proportion(cla_group_lf, 'CommitmentAmt')
+    cla_group_lf = cap_max_proportion(cla_group_lf, 'OutstandingAmt')
+    cla_group_lf = cap_max_proportion(cla_group_lf, 'Deals')
 
+    cla_group_df = cla_group_lf.collect()
     print("Group DataFrame columns after capping:", cla_group_df.columns)
 
     # Get pivoted dataframes for each capped field
@@ -935,7 +1072,7 @@ def setup_groups(cla_input_df: pl.DataFrame, max_mom: float = BusinessConfig.MAX
     return cla_ca_pivot_df, cla_oa_pivot_df, cla_deals_pivot_df
 
 
-def testCappedvsUncapped(cla_input_df, ca_perc_diff, oa_perc_diff, deals_perc_diff, file_name):
+def testCappedvsUncapped(cla_input_df, ca_perc_diff, oa_perc_diff, deals_perc_diff, file_name=None):
     start_time = time.time()
     print("Starting data processing...")
 
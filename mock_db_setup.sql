@@ -1,7 +1,30 @@
 -- Create schema and table structure to satisfy backend queries
 CREATE SCHEMA IF NOT EXISTS cla_uat;
 
+DROP MATERIALIZED VIEW IF EXISTS cla_uat.filter_options_mv;
+DROP MATERIALIZED VIEW IF EXISTS cla_uat.summary_stats_mv;
 DROP TABLE IF EXISTS cla_uat.mv_t_cla_input_full_upd;
+
+-- Small dimension tables for the hot filter columns; the fact table carries 2-byte keys into them
+DROP TABLE IF EXISTS cla_uat.dim_region, cla_uat.dim_naics_group,
+  cla_uat.dim_commitment_size_group, cla_uat.dim_risk_group;
+CREATE TABLE cla_uat.dim_region (
+    "RegionId" SMALLINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    "Region" TEXT NOT NULL UNIQUE
+);
+CREATE TABLE cla_uat.dim_naics_group (
+    "NAICSGrpId" SMALLINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    "NAICSGrpName" TEXT NOT NULL UNIQUE
+);
+CREATE TABLE cla_uat.dim_commitment_size_group (
+    "CommitmentSizeGroupId" SMALLINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    "CommitmentSizeGroup" TEXT NOT NULL UNIQUE
+);
+CREATE TABLE cla_uat.dim_risk_group (
+    "RiskGroupId" SMALLINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    "RiskGroupDesc" TEXT NOT NULL UNIQUE
+);
+
 CREATE TABLE cla_uat.mv_t_cla_input_full_upd (
     "ProcessingDateKey" INTEGER NOT NULL,
     "CommitmentAmt" NUMERIC(18,2),
@@ -15,9 +38,57 @@ CREATE TABLE cla_uat.mv_t_cla_input_full_upd (
     "BankID" TEXT,
     "MaturityTermMonths" INTEGER,
     "SpreadBPS" NUMERIC(10,2),
-    "YieldPct" NUMERIC(10,4)
+    "YieldPct" NUMERIC(10,4),
+    -- Real date for range filters; make_date is immutable where to_date is not
+    "ProcessingDate" DATE GENERATED ALWAYS AS (
+        make_date("ProcessingDateKey" / 10000, ("ProcessingDateKey" / 100) % 100, "ProcessingDateKey" % 100)
+    ) STORED,
+    -- Surrogate keys the API filters on, kept in step by the set_dimension_keys trigger; the text columns stay for display
+    "RegionId" SMALLINT REFERENCES cla_uat.dim_region,
+    "NAICSGrpId" SMALLINT REFERENCES cla_uat.dim_naics_group,
+    "CommitmentSizeGroupId" SMALLINT REFERENCES cla_uat.dim_commitment_size_group,
+    "RiskGroupId" SMALLINT REFERENCES cla_uat.dim_risk_group
 );
 
+-- Key for a dimension label, adding the label on first sight. Known labels never reach the INSERT,
+-- so reloads don't burn smallint identity values; a concurrent first insert is picked up by the re-SELECT
+CREATE OR REPLACE FUNCTION cla_uat.dimension_key(dim regclass, key_col text, label_col text, label text)
+RETURNS smallint AS $$
+DECLARE
+  dim_key smallint;
+BEGIN
+  IF label IS NULL THEN
+    RETURN NULL;
+  END IF;
+  EXECUTE format('SELECT %I FROM %s WHERE %I = $1', key_col, dim, label_col) INTO dim_key USING label;
+  IF dim_key IS NULL THEN
+    EXECUTE format('INSERT INTO %s (%I) VALUES ($1) ON CONFLICT (%I) DO NOTHING RETURNING %I',
+                   dim, label_col, label_col, key_col) INTO dim_key USING label;
+    IF dim_key IS NULL THEN
+      EXECUTE format('SELECT %I FROM %s WHERE %I = $1', key_col, dim, label_col) INTO dim_key USING label;
+    END IF;
+  END IF;
+  RETURN dim_key;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Every row written to the fact table gets its dimension keys from its text labels, so later loads
+-- stay visible to the key-based filters in backend_api
+CREATE OR REPLACE FUNCTION cla_uat.set_dimension_keys() RETURNS trigger AS $$
+BEGIN
+  NEW."RegionId" := cla_uat.dimension_key('cla_uat.dim_region', 'RegionId', 'Region', NEW."Region");
+  NEW."NAICSGrpId" := cla_uat.dimension_key('cla_uat.dim_naics_group', 'NAICSGrpId', 'NAICSGrpName', NEW."NAICSGrpName");
+  NEW."CommitmentSizeGroupId" := cla_uat.dimension_key(
+    'cla_uat.dim_commitment_size_group', 'CommitmentSizeGroupId', 'CommitmentSizeGroup', NEW."CommitmentSizeGroup");
+  NEW."RiskGroupId" := cla_uat.dimension_key('cla_uat.dim_risk_group', 'RiskGroupId', 'RiskGroupDesc', NEW."RiskGroupDesc");
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER set_dimension_keys
+BEFORE INSERT OR UPDATE ON cla_uat.mv_t_cla_input_full_upd
+FOR EACH ROW EXECUTE FUNCTION cla_uat.set_dimension_keys();
+
 -- Drop existing aggregated_analytics view or table if present
 DO $$
 BEGIN
@@ -110,10 +181,103 @@ SELECT
 FROM lagged l;
 
 -- Helpful indexes
-CREATE INDEX IF NOT EXISTS idx_mv_processing_date ON cla_uat.mv_t_cla_input_full_upd ("ProcessingDateKey");
+-- Covering btree: MAX("ProcessingDateKey") and the latest-month sums are answered index-only
+CREATE INDEX IF NOT EXISTS idx_mv_processing_date ON cla_uat.mv_t_cla_input_full_upd ("ProcessingDateKey")
+  INCLUDE ("CommitmentAmt", "OutstandingAmt");
+-- Loads arrive in date order, so a BRIN over the generated date prunes ranges at a fraction of a btree's size
+CREATE INDEX IF NOT EXISTS idx_mv_processing_date_brin ON cla_uat.mv_t_cla_input_full_upd
+  USING BRIN ("ProcessingDate") WITH (pages_per_range = 32);
 CREATE INDEX IF NOT EXISTS idx_mv_lob ON cla_uat.mv_t_cla_input_full_upd ("LineofBusinessId");
 CREATE INDEX IF NOT EXISTS idx_mv_region ON cla_uat.mv_t_cla_input_full_upd ("Region");
 CREATE INDEX IF NOT EXISTS idx_mv_naics ON cla_uat.mv_t_cla_input_full_upd ("NAICSGrpName");
 CREATE INDEX IF NOT EXISTS idx_mv_bank ON cla_uat.mv_t_cla_input_full_upd ("BankID");
+CREATE INDEX IF NOT EXISTS idx_mv_size_group ON cla_uat.mv_t_cla_input_full_upd ("CommitmentSizeGroup");
+CREATE INDEX IF NOT EXISTS idx_mv_risk_group ON cla_uat.mv_t_cla_input_full_upd ("RiskGroupDesc");
+CREATE INDEX IF NOT EXISTS idx_mv_region_id ON cla_uat.mv_t_cla_input_full_upd ("RegionId");
+CREATE INDEX IF NOT EXISTS idx_mv_naics_id ON cla_uat.mv_t_cla_input_full_upd ("NAICSGrpId");
+CREATE INDEX IF NOT EXISTS idx_mv_size_group_id ON cla_uat.mv_t_cla_input_full_upd ("CommitmentSizeGroupId");
+CREATE INDEX IF NOT EXISTS idx_mv_risk_group_id ON cla_uat.mv_t_cla_input_full_upd ("RiskGroupId");
+
+-- Pre-aggregated filter options for /api/filter-options; the API refreshes it (and summary_stats_mv)
+-- CONCURRENTLY on a schedule
+CREATE MATERIALIZED VIEW cla_uat.filter_options_mv AS
+SELECT 'lineOfBusiness' AS "FilterName",
+       CASE WHEN "LineofBusiness" IS NOT NULL
+            THEN "LineofBusinessId" || ' - ' || "LineofBusiness"
+            ELSE "LineofBusinessId" END AS "Value",
+       "LineofBusinessId" AS "SortKey"
+FROM (
+  -- NULL and '' both mean no name; folding them before DISTINCT keeps one row per id for the unique index
+  SELECT DISTINCT "LineofBusinessId", NULLIF("LineofBusiness", '') AS "LineofBusiness"
+  FROM cla_uat.mv_t_cla_input_full_upd
+  WHERE "LineofBusinessId" IS NOT NULL
+) lob
+UNION ALL
+SELECT DISTINCT 'commitmentSizeGroup', "CommitmentSizeGroup", "CommitmentSizeGroup"
+FROM cla_uat.mv_t_cla_input_full_upd WHERE "CommitmentSizeGroup" IS NOT NULL
+UNION ALL
+SELECT DISTINCT 'riskGroup', "RiskGroupDesc", "RiskGroupDesc"
+FROM cla_uat.mv_t_cla_input_full_upd WHERE "RiskGroupDesc" IS NOT NULL
+UNION ALL
+SELECT DISTINCT 'bankId', "BankID", "BankID"
+FROM cla_uat.mv_t_cla_input_full_upd WHERE "BankID" IS NOT NULL
+UNION ALL
+SELECT DISTINCT 'region', "Region", "Region"
+FROM cla_uat.mv_t_cla_input_full_upd WHERE "Region" IS NOT NULL
+UNION ALL
+SELECT DISTINCT 'naicsGrpName', "NAICSGrpName", "NAICSGrpName"
+FROM cla_uat.mv_t_cla_input_full_upd WHERE "NAICSGrpName" IS NOT NULL;
+
+-- REFRESH ... CONCURRENTLY needs a unique index
+CREATE UNIQUE INDEX IF NOT EXISTS idx_filter_options_mv ON cla_uat.filter_options_mv ("FilterName", "SortKey", "Value");
 
+-- Single-row /api/summary-stats payload: whole-table aggregates plus the latest month's totals
+CREATE MATERIALIZED VIEW cla_uat.summary_stats_mv AS
+WITH totals AS (
+  SELECT COUNT(*) AS total_records,
+         MIN("ProcessingDateKey") AS earliest_date,
+         MAX("ProcessingDateKey") AS latest_date,
+         SUM("CommitmentAmt")::float8 AS total_commitment,
+         AVG("CommitmentAmt")::float8 AS avg_commitment
+  FROM cla_uat.mv_t_cla_input_full_upd
+  WHERE "CommitmentAmt" IS NOT NULL
+),
+counts AS (
+  SELECT (SELECT COUNT(*) FROM (SELECT "ProcessingDateKey" FROM cla_uat.mv_t_cla_input_full_upd
+            WHERE "CommitmentAmt" IS NOT NULL GROUP BY 1) g) AS unique_months,
+         (SELECT COUNT(*) FROM (SELECT "Region" FROM cla_uat.mv_t_cla_input_full_upd
+            WHERE "CommitmentAmt" IS NOT NULL AND "Region" IS NOT NULL GROUP BY 1) g) AS unique_regions,
+         (SELECT COUNT(*) FROM (SELECT "LineofBusinessId" FROM cla_uat.mv_t_cla_input_full_upd
+            WHERE "CommitmentAmt" IS NOT NULL AND "LineofBusinessId" IS NOT NULL GROUP BY 1) g) AS unique_lobs,
+         (SELECT COUNT(*) FROM (SELECT "BankID" FROM cla_uat.mv_t_cla_input_full_upd
+            WHERE "CommitmentAmt" IS NOT NULL AND "BankID" IS NOT NULL GROUP BY 1) g) AS unique_banks
+),
+maxd AS (
+  SELECT MAX("ProcessingDateKey") AS md FROM cla_uat.mv_t_cla_input_full_upd
+),
+latest AS (
+  SELECT f."ProcessingDateKey" AS latest_month,
+         COUNT(*) AS latest_deals,
+         SUM(f."CommitmentAmt")::float8 AS latest_commitment,
+         SUM(f."OutstandingAmt")::float8 AS latest_outstanding
+  FROM cla_uat.mv_t_cla_input_full_upd f JOIN maxd ON f."ProcessingDateKey" = maxd.md
+  GROUP BY f."ProcessingDateKey"
+)
+SELECT 1 AS "Id", t.total_records, c.unique_months, t.earliest_date, t.latest_date,
+       t.total_commitment, t.avg_commitment, c.unique_regions, c.unique_lobs, c.unique_banks,
+       l.latest_month, l.latest_deals, l.latest_commitment, l.latest_outstanding
+FROM totals t CROSS JOIN counts c LEFT JOIN latest l ON true;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_summary_stats_mv ON cla_uat.summary_stats_mv ("Id");
+
+-- Tell the API to drop its cached filter options and summary stats whenever the source table changes
+CREATE OR REPLACE FUNCTION cla_uat.notify_analytics_changed() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('analytics_changed', TG_TABLE_NAME);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
 
+CREATE TRIGGER notify_data_change
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON cla_uat.mv_t_cla_input_full_upd
+FOR EACH STATEMENT EXECUTE FUNCTION cla_uat.notify_analytics_changed();